@@ -11,6 +11,7 @@ from PySide6.QtWidgets import QApplication, QDialog, QVBoxLayout, QLabel
 
 from src.basic_config import log_level
 from src.database import db
+from src.database_executor import executor
 from src.main_application import MainWindow
 
 logging.basicConfig()
@@ -70,6 +71,9 @@ def run():
     main_window.initialize()
     main_window.show()
     exit_code = app.exec()
+    main_window.self_test.statistics_buffer.release_snapshot()
+    main_window.self_test.statistics_buffer.flush()
+    executor.shutdown()
     db.close_connection()
     sys.exit(exit_code)
 
@@ -0,0 +1,42 @@
+"""add fts5 full text index for question and answer text
+
+Revision ID: 0b7e3f5a9c14
+Revises: 3c1f0a9d7e21
+Create Date: 2026-10-18 13:40:02.137560
+
+"""
+from alembic import op
+
+
+revision = '0b7e3f5a9c14'
+down_revision = '3c1f0a9d7e21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE VIRTUAL TABLE question_fts USING fts5("
+               "question, answer_text, content='question', content_rowid='rowid', tokenize='trigram')")
+    op.execute("CREATE TRIGGER question_fts_insert AFTER INSERT ON question BEGIN "
+               "INSERT INTO question_fts(rowid, question, answer_text) "
+               "VALUES (new.rowid, new.question, new.answer_text); "
+               "END")
+    op.execute("CREATE TRIGGER question_fts_delete AFTER DELETE ON question BEGIN "
+               "INSERT INTO question_fts(question_fts, rowid, question, answer_text) "
+               "VALUES ('delete', old.rowid, old.question, old.answer_text); "
+               "END")
+    op.execute("CREATE TRIGGER question_fts_update AFTER UPDATE OF question, answer_text ON question BEGIN "
+               "INSERT INTO question_fts(question_fts, rowid, question, answer_text) "
+               "VALUES ('delete', old.rowid, old.question, old.answer_text); "
+               "INSERT INTO question_fts(rowid, question, answer_text) "
+               "VALUES (new.rowid, new.question, new.answer_text); "
+               "END")
+    # index the already existing questions
+    op.execute("INSERT INTO question_fts(question_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    op.execute("DROP TRIGGER question_fts_update")
+    op.execute("DROP TRIGGER question_fts_delete")
+    op.execute("DROP TRIGGER question_fts_insert")
+    op.execute("DROP TABLE question_fts")
@@ -0,0 +1,34 @@
+"""add indexes for the hot query predicates
+
+Revision ID: 3c1f0a9d7e21
+Revises: 6ea786c6938c
+Create Date: 2026-10-18 10:12:31.482913
+
+"""
+from alembic import op
+
+
+revision = '3c1f0a9d7e21'
+down_revision = '6ea786c6938c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_question_group_id_answer_index', 'question', ['group_id', 'answer_index', 'signature'])
+    op.create_index('ix_regeltest_question_question_id', 'regeltest_question', ['question_id'])
+    op.create_index('ix_regeltest_question_regeltest_id', 'regeltest_question', ['regeltest_id'])
+    op.create_index('ix_statistics_level_last_tested', 'statistics', ['level', 'last_tested'])
+    op.create_index('ix_statistics_last_tested', 'statistics', ['last_tested'])
+    op.create_index('ix_regeltest_icon_id', 'regeltest', ['icon_id'])
+    # refresh the planner statistics so the new indexes are actually picked
+    op.execute('ANALYZE')
+
+
+def downgrade():
+    op.drop_index('ix_regeltest_icon_id', table_name='regeltest')
+    op.drop_index('ix_statistics_last_tested', table_name='statistics')
+    op.drop_index('ix_statistics_level_last_tested', table_name='statistics')
+    op.drop_index('ix_regeltest_question_regeltest_id', table_name='regeltest_question')
+    op.drop_index('ix_regeltest_question_question_id', table_name='regeltest_question')
+    op.drop_index('ix_question_group_id_answer_index', table_name='question')
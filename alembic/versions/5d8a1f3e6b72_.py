@@ -0,0 +1,25 @@
+"""add indexes for the ordered question group reads
+
+Revision ID: 5d8a1f3e6b72
+Revises: 9e4c2b7d5a31
+Create Date: 2026-10-18 16:05:12.318846
+
+"""
+from alembic import op
+
+
+revision = '5d8a1f3e6b72'
+down_revision = '9e4c2b7d5a31'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_question_group_id_question_id', 'question', ['group_id', 'question_id', 'signature'])
+    op.create_index('ix_question_group_id_last_edited', 'question', ['group_id', 'last_edited', 'signature'])
+    op.execute('ANALYZE')
+
+
+def downgrade():
+    op.drop_index('ix_question_group_id_last_edited', table_name='question')
+    op.drop_index('ix_question_group_id_question_id', table_name='question')
@@ -0,0 +1,50 @@
+"""store regeltest icons as original files deduplicated by sha256
+
+Revision ID: 9e4c2b7d5a31
+Revises: 0b7e3f5a9c14
+Create Date: 2026-10-18 14:21:47.902311
+
+"""
+import hashlib
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision = '9e4c2b7d5a31'
+down_revision = '0b7e3f5a9c14'
+branch_labels = None
+depends_on = None
+
+# the UNIQUE constraint on icon was created without a name
+naming_convention = {"uq": "uq_%(table_name)s_%(column_0_name)s"}
+
+
+def upgrade():
+    with op.batch_alter_table('regeltest_icon', naming_convention=naming_convention) as batch_op:
+        batch_op.drop_constraint('uq_regeltest_icon_icon', type_='unique')
+        batch_op.add_column(sa.Column('sha256', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('width', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('height', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('mode', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('format', sa.String(), nullable=True))
+
+    # existing icons are raw pixel dumps (Image.tobytes()), size and mode were not stored. Icons without data keep
+    # a NULL sha256, the unique index does not apply to them (the old UNIQUE constraint did not either)
+    connection = op.get_bind()
+    icons = connection.execute(sa.text("SELECT id, icon FROM regeltest_icon WHERE icon IS NOT NULL")).all()
+    for icon_id, icon in icons:
+        connection.execute(sa.text("UPDATE regeltest_icon SET sha256 = :sha256, format = 'raw' WHERE id = :id"),
+                           {"sha256": hashlib.sha256(icon).hexdigest(), "id": icon_id})
+    op.create_index('ix_regeltest_icon_sha256', 'regeltest_icon', ['sha256'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_regeltest_icon_sha256', table_name='regeltest_icon')
+    with op.batch_alter_table('regeltest_icon', naming_convention=naming_convention) as batch_op:
+        batch_op.drop_column('format')
+        batch_op.drop_column('mode')
+        batch_op.drop_column('height')
+        batch_op.drop_column('width')
+        batch_op.drop_column('sha256')
+        batch_op.create_unique_constraint('uq_regeltest_icon_icon', ['icon'])
@@ -0,0 +1,105 @@
+import datetime
+import json
+import random
+from typing import TextIO, List, Tuple
+from xml.sax.saxutils import escape
+
+# DFB data has 17 rule groups, roughly a third of the questions are multiple choice. Real files contain the same
+# question number or signature twice now and then and some rules have no creation date.
+group_names = ["Spielfeld", "Ball", "Zahl der Spieler", "Ausrüstung der Spieler", "Schiedsrichter",
+               "Die weiteren Spieloffiziellen", "Dauer des Spiels", "Beginn und Fortsetzung des Spiels",
+               "Ball in und aus dem Spiel", "Bestimmung des Spielausgangs", "Abseits",
+               "Fouls und unsportliches Betragen", "Freistöße", "Strafstoß", "Einwurf", "Abstoß", "Eckstoß"]
+question_words = ["Spieler", "Torwart", "Schiedsrichter", "Ball", "Strafraum", "Abseits", "Freistoß", "Einwurf",
+                  "Auswechselspieler", "Mannschaftsoffizieller", "Tor", "Verwarnung", "Feldverweis", "Vorteil"]
+answer_words = ["Indirekter Freistoß", "Direkter Freistoß", "Strafstoß", "Schiedsrichter-Ball", "Weiterspielen",
+                "Verwarnung", "Feldverweis", "Tor", "Abstoß", "Eckstoß", "Einwurf", "Wiederholung"]
+
+
+def _sentence(rng: random.Random, words: List[str], length: Tuple[int, int]) -> str:
+    return " ".join(rng.choice(words) for _ in range(rng.randint(*length)))
+
+
+def _date(rng: random.Random) -> datetime.date:
+    return datetime.date(2010, 1, 1) + datetime.timedelta(days=rng.randrange(15 * 365))
+
+
+def generate_questions(count: int, seed: int = 0, mchoice_ratio: float = 0.3, duplicate_ratio: float = 0.01,
+                       missing_date_ratio: float = 0.05):
+    # raw generator shared by both formats: (group_id, question_id, signature, question, mchoice, answer_index,
+    # answer_text, created or None, last_edited). duplicate_ratio of the rows repeat an earlier number or signature
+    rng = random.Random(seed)
+    question_ids = [0] * len(group_names)
+    previous = []
+    for _ in range(count):
+        if previous and rng.random() < duplicate_ratio:
+            duplicate = list(rng.choice(previous))
+            if rng.random() < 0.5:
+                # same number, new content
+                duplicate[2] = f"{rng.getrandbits(128):032x}"
+                duplicate[3] = _sentence(rng, question_words, (8, 30)) + "?"
+            else:
+                # same signature under a new number
+                question_ids[duplicate[0] - 1] += 1
+                duplicate[1] = question_ids[duplicate[0] - 1]
+            yield tuple(duplicate)
+            continue
+        group_id = rng.randint(1, len(group_names))
+        question_ids[group_id - 1] += 1
+        question = _sentence(rng, question_words, (8, 30)) + "?"
+        if rng.random() < mchoice_ratio:
+            mchoice = [_sentence(rng, answer_words, (1, 4)) for _ in range(3)]
+            answer_index = rng.randrange(3)
+            answer_text = mchoice[answer_index]
+        else:
+            mchoice = []
+            answer_index = -1
+            answer_text = _sentence(rng, answer_words, (2, 12))
+        created = None if rng.random() < missing_date_ratio else _date(rng)
+        last_edited = (created or datetime.date(2010, 1, 1)) + datetime.timedelta(days=rng.randrange(400))
+        row = (group_id, question_ids[group_id - 1], f"{rng.getrandbits(128):032x}", question, mchoice,
+               answer_index, answer_text, created, last_edited)
+        if len(previous) < 1000:
+            previous += [row]
+        yield row
+
+
+def write_dfb_xml(file: TextIO, count: int, seed: int = 0, **kwargs):
+    file.write('<?xml version="1.0" encoding="utf-8"?>\n<REGELDATEN>\n<GRUPPEN>\n')
+    for group_id, name in enumerate(group_names, start=1):
+        file.write(f"<GRUPPE><GRUPPENNR>{group_id}</GRUPPENNR><GRUPPENTEXT>{escape(name)}</GRUPPENTEXT></GRUPPE>\n")
+    file.write("</GRUPPEN>\n")
+    for group_id, question_id, signature, question, mchoice, answer_index, answer_text, created, last_edited \
+            in generate_questions(count, seed, **kwargs):
+        if mchoice:
+            mchoice_text = "\n".join(f"{letter} ( ) {text}" for letter, text in zip("abc", mchoice))
+            answer_text = f"{'abc'[answer_index]}) {answer_text}"
+        else:
+            # DFB files contain a single blank for questions without multiple choice
+            mchoice_text = " "
+        created = created.strftime("%d.%m.%Y") if created else " "
+        file.write(f"<REGELSATZ><LNR>{group_id:02d}{question_id:03d}</LNR><SIGNATUR>{signature}</SIGNATUR>"
+                   f"<FRAGE>{escape(question)}</FRAGE><MCHOICE>{escape(mchoice_text)}</MCHOICE>"
+                   f"<ANTWORT>{escape(answer_text)}</ANTWORT><ERST>{created}</ERST>"
+                   f"<AEND>{last_edited.strftime('%d.%m.%Y')}</AEND></REGELSATZ>\n")
+    file.write("</REGELDATEN>\n")
+
+
+def write_sr_regeltest_de_json(file: TextIO, count: int, seed: int = 0, **kwargs):
+    # sr-regeltest.de exports always carry both dates and no signature
+    kwargs["missing_date_ratio"] = 0
+    questions = [{
+        "group_id": group_id,
+        "question_id": question_id,
+        "question": question,
+        "answer_index": answer_index,
+        "answer_text": answer_text,
+        "created": created.isoformat(),
+        "last_edited": last_edited.isoformat(),
+        "multiple_choice": mchoice
+    } for group_id, question_id, _, question, mchoice, answer_index, answer_text, created, last_edited
+        in generate_questions(count, seed, **kwargs)]
+    json.dump({
+        "question_groups": [{"id": group_id, "name": name} for group_id, name in enumerate(group_names, start=1)],
+        "questions": questions
+    }, file)
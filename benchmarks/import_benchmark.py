@@ -0,0 +1,195 @@
+import argparse
+import datetime
+import gc
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass, asdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+repository_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repository_path)
+
+from benchmarks.generators import write_dfb_xml, write_sr_regeltest_de_json  # noqa: E402
+
+
+@dataclass
+class BenchmarkResult:
+    benchmark: str
+    questions: int
+    rows: int
+    seconds: float
+    peak_memory: Optional[float]  # MiB
+    rows_per_second: float
+
+
+def measure(function: Callable[[], int], repeat: int, memory: bool) -> Tuple[int, float, Optional[float]]:
+    # best wall time of repeat runs, peak memory in a separate run (tracemalloc slows everything down)
+    seconds = float("inf")
+    rows = 0
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        rows = function()
+        seconds = min(seconds, time.perf_counter() - start)
+    peak_memory = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        function()
+        peak_memory = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    return rows, seconds, peak_memory
+
+
+benchmark_names = ("read_in_origformat", "create_questions_and_mchoice", "iterparse_origformat",
+                   "read_in_sr_regeltest_de", "stream_sr_regeltest_de",
+                   "fill_database_origformat", "fill_database_sr_regeltest_de")
+
+
+def benchmarks(xml_path: str, json_path: str, database_directory: str, selected: List[str]) \
+        -> Dict[str, Callable[[], int]]:
+    from bs4 import BeautifulSoup
+
+    from src.database import DatabaseConnector
+    from src.datatypes import create_questions_and_mchoice, iterparse_origformat
+    from src.main_application import read_in_origformat, read_in_sr_regeltest_de, stream_sr_regeltest_de
+
+    rules_xml = []
+    if "create_questions_and_mchoice" in selected:
+        with open(xml_path, encoding='utf-8') as file:
+            rules_xml = BeautifulSoup(file, "lxml-xml")("REGELSATZ")
+
+    def origformat():
+        with open(xml_path, encoding='utf-8') as file:
+            return len(read_in_origformat(BeautifulSoup(file, "lxml-xml"))[1])
+
+    def questions_and_mchoice():
+        # parsing is not part of it, rules_xml is parsed once beforehand
+        return len(create_questions_and_mchoice(rules_xml))
+
+    def iterparse():
+        return sum(len(batch) for batch in iterparse_origformat(xml_path)[1])
+
+    def sr_regeltest_de():
+        with open(json_path, encoding='utf-8') as file:
+            return len(read_in_sr_regeltest_de(json.load(file))[1])
+
+    def sr_regeltest_de_stream():
+        with open(json_path, encoding='utf-8') as file:
+            return sum(len(batch) for batch in stream_sr_regeltest_de(file)[1])
+
+    def fill_database(datasets: Callable[[], tuple]):
+        def run():
+            # a fresh database for every run
+            database_path = os.path.join(database_directory, "benchmark.db")
+            connector = DatabaseConnector(database_path)
+            if connector.profiler:
+                connector.profiler.remove()
+            try:
+                connector.fill_database(*datasets())
+                return connector.get_question_count()
+            finally:
+                connector.close_connection()
+                for suffix in ("", "-wal", "-shm"):
+                    if os.path.isfile(database_path + suffix):
+                        os.remove(database_path + suffix)
+        return run
+
+    def xml_datasets():
+        question_groups, batches = iterparse_origformat(xml_path)
+        return question_groups, itertools.chain.from_iterable(batches)
+
+    def json_datasets():
+        with open(json_path, encoding='utf-8') as file:
+            return read_in_sr_regeltest_de(json.load(file))
+
+    functions = {
+        "read_in_origformat": origformat,
+        "create_questions_and_mchoice": questions_and_mchoice,
+        "iterparse_origformat": iterparse,
+        "read_in_sr_regeltest_de": sr_regeltest_de,
+        "stream_sr_regeltest_de": sr_regeltest_de_stream,
+        "fill_database_origformat": fill_database(xml_datasets),
+        "fill_database_sr_regeltest_de": fill_database(json_datasets),
+    }
+    return {name: functions[name] for name in selected}
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=repository_path, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: List[BenchmarkResult], baseline_path: str):
+    with open(baseline_path, encoding='utf-8') as file:
+        baseline = {(result["benchmark"], result["questions"]): result for result in json.load(file)["results"]}
+    for result in results:
+        previous = baseline.get((result.benchmark, result.questions))
+        if previous is None:
+            continue
+        memory = ""
+        if result.peak_memory is not None and previous["peak_memory"]:
+            memory = f", memory {result.peak_memory / previous['peak_memory']:.2f}x"
+        print(f"{result.benchmark} ({result.questions}): time {result.seconds / previous['seconds']:.2f}x{memory}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import benchmarks on synthetic DFB and sr-regeltest.de datasets")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--benchmarks", nargs="+", choices=benchmark_names, default=list(benchmark_names))
+    parser.add_argument("--repeat", type=int, default=1, help="wall time is the best of REPEAT runs")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", metavar="RESULTS", help="print ratios against an earlier results file")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output)
+    baseline = os.path.abspath(args.compare) if args.compare else None
+
+    with tempfile.TemporaryDirectory(prefix="regeltestcreator_benchmark_") as directory:
+        # headless and without touching the real database: set before anything from src is imported
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        os.environ["REGELTESTCREATOR_DATA_DIR"] = directory
+        # alembic is looked up relative to the working directory
+        os.chdir(repository_path)
+
+        results = []
+        for size in args.sizes:
+            xml_path = os.path.join(directory, f"dfb_{size}.xml")
+            json_path = os.path.join(directory, f"sr_regeltest_de_{size}.json")
+            with open(xml_path, "w", encoding='utf-8') as file:
+                write_dfb_xml(file, size, args.seed)
+            with open(json_path, "w", encoding='utf-8') as file:
+                write_sr_regeltest_de_json(file, size, args.seed)
+            for name, function in benchmarks(xml_path, json_path, directory, args.benchmarks).items():
+                rows, seconds, peak_memory = measure(function, args.repeat, not args.no_memory)
+                result = BenchmarkResult(name, size, rows, seconds, peak_memory, rows / seconds if seconds else 0)
+                memory = f", {peak_memory:.1f} MiB" if peak_memory is not None else ""
+                print(f"{name} ({size}): {rows} rows in {seconds:.3f}s ({result.rows_per_second:.0f} rows/s){memory}",
+                      flush=True)
+                results += [result]
+
+    with open(output, "w", encoding='utf-8') as file:
+        json.dump({
+            "revision": git_revision(),
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "results": [asdict(result) for result in results]
+        }, file, indent=2)
+    if baseline:
+        compare(results, baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -29,6 +29,8 @@ display_name = "RegeltestCreator"
 app_name = "RegeltestCreator"
 app_author = "jfeil"
 app_dirs = AppDirs(appname=app_name, appauthor=app_author)
+# REGELTESTCREATOR_DATA_DIR moves database and logs elsewhere (benchmarks, throwaway test setups)
+data_directory = os.environ.get("REGELTESTCREATOR_DATA_DIR") or app_dirs.user_data_dir
 
 app_version = __version__
 if not is_bundled and "dev" not in __version__:
@@ -40,6 +42,46 @@ dev_release = "?per_page=1"
 stable_release = "/latest"
 
 database_name = "database.db"
+# newest alembic revision shipped with this build, startup skips alembic if the database is already there
+database_revision = "5d8a1f3e6b72"
+# PRAGMAs applied to every new SQLite connection, "durable" survives power loss, "fast" may lose the last commits
+database_profiles = {
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "mmap_size": 0,
+        "cache_size": -8192,  # negative values are KiB
+        "temp_store": "DEFAULT",
+        "busy_timeout": 5000,  # ms
+    },
+    "fast": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -65536,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+}
+database_profile = "durable"
+# per statement timing (db.profiler.snapshot()), statements slower than the threshold (seconds) are written to
+# slow_query_log in the data directory together with their query plan
+query_profiling = not is_bundled
+slow_query_threshold = 0.1
+slow_query_log = "slow_queries.log"
+# self-test answers are committed in batches: after this many seconds or answers, whatever comes first
+# (and when leaving the self-test or closing the app). 0 seconds commits every answer immediately
+statistics_flush_interval = 10
+statistics_flush_size = 25
+# the self-test reads from an in-memory copy of the database, the file is only written when statistics are flushed
+self_test_snapshot = False
+# bigger change sets (imports) are not tracked row by row, the question tables are reloaded instead
+change_tracking_limit = 5000
+# question tables of tabs which were not shown for this many seconds are released (reloaded on the next visit)
+tab_release_timeout = 300
+# question groups with at least this many questions are sorted by the database (ORDER BY) instead of the table,
+# for the indexed columns (QuestionGroupDataModel.sql_sort_columns), the other columns are still sorted by the table
+sql_sort_threshold = 5000
 
 
 class EagerDefault:
@@ -81,7 +123,8 @@ def check_for_update() -> Tuple[VERSION_INFO, VERSION_INFO]:  # new_version, des
 def defaults_included_constructor(instance, **kwds):
     mapper = inspect(instance).mapper
     for column in mapper.columns:
-        if column.default is None:
+        # query expressions (e.g. Question.regeltest_usage) are mapped as labels without any default
+        if getattr(column, "default", None) is None:
             continue
         default = getattr(column.default, "arg")
         if default is not None:
@@ -1,69 +1,388 @@
 from __future__ import annotations
 
+import contextlib
+import functools
+import hashlib
+import itertools
 import logging
 import os
+import re
 import sys
-from typing import List, Tuple
+import threading
+import time
+import uuid
+from collections import namedtuple
+from dataclasses import dataclass, field
+from typing import List, Tuple, Iterable, Dict, Any, Iterator, Optional, Set, Callable
 
 import sqlalchemy
-from alembic import command
-from alembic.config import Config
-from alembic.runtime.migration import MigrationContext
-from sqlalchemy import create_engine, func
-from sqlalchemy.orm import Session, Query
+from sqlalchemy import create_engine, func, case, event, insert, inspect
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.sql import ColumnElement
+from sqlalchemy.orm import Session, Query, joinedload, subqueryload, selectinload, with_expression, sessionmaker, \
+    scoped_session
+from sqlalchemy.orm.base import NO_VALUE
+
+from src.basic_config import database_name, Base, is_bundled, data_directory, database_profiles, database_profile, \
+    database_revision, query_profiling, slow_query_threshold, slow_query_log, change_tracking_limit
+from src.datatypes import QuestionGroup, Question, MultipleChoice, Regeltest, Statistics, RegeltestQuestion, \
+    RegeltestIcon, question_fts_columns
+from src.query_profiler import QueryProfiler
+
+database_path = os.path.join(data_directory, database_name)
+
+
+@dataclass
+class ImportReport:
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    skipped: int = 0
+    seconds: float = 0
+
+    @property
+    def rows_per_second(self) -> float:
+        if not self.seconds:
+            return 0
+        return (self.inserted + self.updated + self.unchanged + self.skipped) / self.seconds
+
+    def __str__(self):
+        return f"{self.inserted} inserted, {self.updated} updated, {self.unchanged} unchanged, " \
+               f"{self.skipped} duplicated rows " \
+               f"in {self.seconds:.2f}s ({self.rows_per_second:.0f} rows/s)"
+
+
+@dataclass
+class DatabaseChanges:
+    # committed row changes: question signature -> group id (None if unknown, e.g. only statistics changed).
+    # reset: too many or untracked changes (bulk imports, clear), everything has to be reloaded
+    inserted: Dict[str, Optional[int]] = field(default_factory=dict)
+    updated: Dict[str, Optional[int]] = field(default_factory=dict)
+    deleted: Set[str] = field(default_factory=set)
+    inserted_groups: Set[int] = field(default_factory=set)
+    updated_groups: Set[int] = field(default_factory=set)
+    deleted_groups: Set[int] = field(default_factory=set)
+    reset: bool = False
 
-from src.basic_config import database_name, Base, is_bundled, app_dirs
-from src.datatypes import QuestionGroup, Question, MultipleChoice, Regeltest
+    def __bool__(self):
+        return bool(self.reset or self.inserted or self.updated or self.deleted or self.inserted_groups or
+                    self.updated_groups or self.deleted_groups)
+
+    def question_inserted(self, signature: str, group_id: Optional[int]):
+        self.deleted.discard(signature)
+        self.inserted[signature] = group_id
+        self._check_limit()
+
+    def question_updated(self, signature: str, group_id: Optional[int]):
+        if signature in self.inserted:
+            if group_id is not None:
+                self.inserted[signature] = group_id
+            return
+        if group_id is None and signature in self.updated:
+            return
+        self.updated[signature] = group_id
+        self._check_limit()
+
+    def question_deleted(self, signature: str):
+        self.updated.pop(signature, None)
+        if self.inserted.pop(signature, False) is not False:
+            # inserted and deleted in the same change set
+            return
+        self.deleted.add(signature)
+        self._check_limit()
+
+    def merge(self, other: DatabaseChanges):
+        self.reset |= other.reset
+        for signature, group_id in other.inserted.items():
+            self.question_inserted(signature, group_id)
+        for signature, group_id in other.updated.items():
+            self.question_updated(signature, group_id)
+        for signature in other.deleted:
+            self.question_deleted(signature)
+        self.inserted_groups |= other.inserted_groups
+        self.updated_groups |= other.updated_groups
+        self.deleted_groups |= other.deleted_groups
+        self._check_limit()
+
+    def _check_limit(self):
+        if self.reset or len(self.inserted) + len(self.updated) + len(self.deleted) > change_tracking_limit:
+            self.reset = True
+            self.inserted.clear()
+            self.updated.clear()
+            self.deleted.clear()
+
+
+QuestionGroupStatistics = namedtuple('QuestionGroupStatistics',
+                                     ['question_group', 'text_count', 'mchoice_count', 'tested_count',
+                                      'untested_count', 'usage_count'], defaults=[None, None, None])
+
+
+def _sample_key(seed, signature) -> int:
+    # reproducible pseudo random order for a given seed, used as ORDER BY sample_key(seed, signature)
+    digest = hashlib.blake2b(f"{seed}:{signature}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+class DatabaseSnapshot:
+    # in-memory copy of the whole database (SQLite backup API) for read heavy sessions like the self-test.
+    # single connection (StaticPool), only to be used from the thread that created it.
+    # changed statistics are written back to the database file by write_statistics()
+    def __init__(self, connector: DatabaseConnector):
+        self.connector = connector
+        self.engine = create_engine("sqlite+pysqlite://", poolclass=StaticPool,
+                                    connect_args={"check_same_thread": False}, future=True)
+        event.listen(self.engine, "connect", connector._register_functions)
+        start = time.perf_counter()
+        with connector.engine.connect() as disk, self.engine.connect() as memory:
+            disk.connection.driver_connection.backup(memory.connection.driver_connection)
+        logging.info(f"Database snapshot created in {time.perf_counter() - start:.3f}s")
+        self.session = Session(self.engine, expire_on_commit=False)
+
+    def write_statistics(self, statistics: Iterable[Statistics]):
+        # the objects stay in (and belong to) the snapshot
+        self.session.commit()
+        self.connector.write_statistics(statistics)
 
-database_path = os.path.join(app_dirs.user_data_dir, database_name)
+    def close(self):
+        self.session.close()
+        self.engine.dispose()
 
 
 class DatabaseConnector:
     engine = None
 
-    def __init__(self, database_path):
-        logging.debug(app_dirs.user_data_dir)
+    def __init__(self, database_path, profile: str = database_profile):
+        logging.debug(data_directory)
         self.initialized = True
-        if not os.path.isdir(app_dirs.user_data_dir):
-            os.makedirs(app_dirs.user_data_dir)
+        if not os.path.isdir(data_directory):
+            os.makedirs(data_directory)
             self.initialized = False
         elif not os.path.isfile(database_path):
             self.initialized = False
-        database_path = f"sqlite+pysqlite:///{database_path}"
-        self.engine = create_engine(f"{database_path}?check_same_thread=False", future=True)
+        self.database_url = f"sqlite+pysqlite:///{database_path}"
+        self.engine = create_engine(f"{self.database_url}?check_same_thread=False", future=True)
+        self.pragmas = database_profiles[profile]
+        event.listen(self.engine, "connect", self._apply_pragmas)
+        event.listen(self.engine, "connect", self._register_functions)
+        self.profiler = None  # type: Optional[QueryProfiler]
+        if query_profiling:
+            self.profiler = QueryProfiler(self.engine, slow_query_threshold,
+                                          os.path.join(data_directory, slow_query_log))
         if is_bundled:
-            base_path = getattr(sys, '_MEIPASS', os.path.abspath(os.path.dirname(__file__)))
+            self.base_path = getattr(sys, '_MEIPASS', os.path.abspath(os.path.dirname(__file__)))
         else:
-            base_path = os.path.curdir
-        self.alembic_cfg = Config(os.path.join(base_path, 'alembic.ini'))
-        self.alembic_cfg.set_main_option('sqlalchemy.url', database_path)
-        self.alembic_cfg.set_main_option('script_location', os.path.join(base_path, 'alembic'))
+            self.base_path = os.path.curdir
 
         if not self.initialized:
             self.initialized = True
             self._init_database()
 
-        self.session = Session(self.engine)
+        # every thread gets its own session (and pooled connection), the GUI thread keeps its long-lived one
+        self.session_factory = sessionmaker(self.engine)
+        self._sessions = scoped_session(self.session_factory)
+        # full text search results, valid until the next commit
+        self._search_cache = {}  # type: Dict[Tuple[str, Tuple[str, ...]], Set[str]]
+        event.listen(self.session_factory, "after_commit", self._invalidate_search_cache)
+        # row level change notifications for the models (see add_change_listener)
+        self._change_listeners = []  # type: List[Callable[[DatabaseChanges], None]]
+        self._change_listeners_lock = threading.Lock()
+        event.listen(self.session_factory, "after_flush", self._track_changes)
+        event.listen(self.session_factory, "after_commit", self._publish_session_changes)
+        event.listen(self.session_factory, "after_rollback", self._discard_session_changes)
         try:
             self._upgrade_database()
         except sqlalchemy.exc.OperationalError as err:
-            self.session.close()
+            self._sessions.remove()
             self.engine.dispose()
             raise err
 
+    def _apply_pragmas(self, dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma, value in self.pragmas.items():
+            cursor.execute(f"PRAGMA {pragma}={value}")
+        cursor.close()
+
+    @staticmethod
+    def _register_functions(dbapi_connection, connection_record):
+        dbapi_connection.create_function("sample_key", 2, _sample_key, deterministic=True)
+
+    @property
+    def session(self) -> Session:
+        return self._sessions()
+
+    @contextlib.contextmanager
+    def unit_of_work(self) -> Iterator[Session]:
+        # short-lived session for background work: commits on success, rolls back on errors and is always closed.
+        # inside the block all db.* methods of this thread use it. Loaded objects stay usable (detached) afterwards.
+        registry = self._sessions.registry
+        previous = registry() if registry.has() else None
+        session = self.session_factory(expire_on_commit=False)
+        registry.set(session)
+        try:
+            yield session
+            session.commit()
+        except BaseException:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+            if previous is None:
+                registry.clear()
+            else:
+                registry.set(previous)
+
+    def _invalidate_search_cache(self, *args):
+        self._search_cache.clear()
+
+    def add_change_listener(self, listener: Callable[[DatabaseChanges], None]):
+        # called after every commit with changes, from the committing thread
+        with self._change_listeners_lock:
+            self._change_listeners.append(listener)
+
+    def remove_change_listener(self, listener: Callable[[DatabaseChanges], None]):
+        with self._change_listeners_lock:
+            self._change_listeners.remove(listener)
+
+    def publish_changes(self, changes: DatabaseChanges):
+        if not changes:
+            return
+        with self._change_listeners_lock:
+            listeners = list(self._change_listeners)
+        for listener in listeners:
+            listener(changes)
+
+    def write_statistics(self, statistics: Iterable[Statistics]):
+        # upsert in one short transaction on the file, the objects are not added to a session (self-test answers
+        # are buffered on detached objects, see StatisticsBuffer)
+        columns = [column.key for column in Statistics.__table__.columns]
+        rows = [{column: getattr(item, column) for column in columns} for item in statistics]
+        if not rows:
+            return
+        statement = sqlite_insert(Statistics.__table__)
+        statement = statement.on_conflict_do_update(
+            index_elements=[Statistics.question_signature],
+            set_={column: statement.excluded[column] for column in columns if column != "question_signature"})
+        with self.engine.begin() as connection:
+            connection.execute(statement, rows)
+        # the statistics were changed behind the back of the session, only these are expired (other pending
+        # changes of the session stay)
+        signatures = {row["question_signature"] for row in rows}
+        for instance in list(self.session.identity_map.values()):
+            if isinstance(instance, Statistics) and instance.question_signature in signatures:
+                self.session.expire(instance)
+            elif isinstance(instance, Question) and instance.signature in signatures:
+                self.session.expire(instance, ['statistics'])
+        changes = DatabaseChanges()
+        for signature in signatures:
+            changes.question_updated(signature, None)
+        self.publish_changes(changes)
+
+    @staticmethod
+    def _track_changes(session: Session, flush_context):
+        # collects the flushed changes of the current transaction, published on commit
+        changes = session.info.setdefault("changes", DatabaseChanges())
+
+        def loaded(instance, attribute: str):
+            # without a query, the objects may be expired or deleted
+            value = inspect(instance).attrs[attribute].loaded_value
+            return None if value is NO_VALUE else value
+
+        for instance in session.new:
+            if isinstance(instance, Question):
+                changes.question_inserted(instance.signature, loaded(instance, "group_id"))
+            elif isinstance(instance, QuestionGroup):
+                changes.inserted_groups.add(instance.id)
+        for instance in session.dirty:
+            if not session.is_modified(instance):
+                continue
+            if isinstance(instance, Question):
+                changes.question_updated(instance.signature, loaded(instance, "group_id"))
+            elif isinstance(instance, QuestionGroup):
+                changes.updated_groups.add(instance.id)
+        for instance in session.deleted:
+            if isinstance(instance, Question):
+                changes.question_deleted(loaded(instance, "signature"))
+            elif isinstance(instance, QuestionGroup):
+                changes.deleted_groups.add(loaded(instance, "id"))
+        # dependent rows shown in the question table
+        for instance in itertools.chain(session.new, session.dirty, session.deleted):
+            if isinstance(instance, (MultipleChoice, Statistics)):
+                signature = loaded(instance, "question_signature")
+            elif isinstance(instance, RegeltestQuestion):
+                signature = loaded(instance, "question_id")
+            else:
+                continue
+            if signature is not None:
+                changes.question_updated(signature, None)
+
+    def _publish_session_changes(self, session: Session):
+        changes = session.info.pop("changes", None)
+        if changes:
+            self.publish_changes(changes)
+
+    @staticmethod
+    def _discard_session_changes(session: Session):
+        session.info.pop("changes", None)
+
+    def snapshot(self) -> DatabaseSnapshot:
+        return DatabaseSnapshot(self)
+
+    def adopt(self, instance: Base) -> Base:
+        # attach an object loaded by another thread's unit of work to this thread's session (no query)
+        if instance in self.session:
+            return instance
+        return self.session.merge(instance, load=False)
+
+    @functools.cached_property
+    def alembic_cfg(self):
+        # alembic is only imported if a migration is actually necessary
+        from alembic.config import Config
+        alembic_cfg = Config(os.path.join(self.base_path, 'alembic.ini'))
+        alembic_cfg.set_main_option('sqlalchemy.url', self.database_url)
+        alembic_cfg.set_main_option('script_location', os.path.join(self.base_path, 'alembic'))
+        return alembic_cfg
+
     def _init_database(self):
+        from alembic import command
         # Create database based on basis and stamp with alembic for future migrations
         Base.metadata.create_all(self.engine)
         command.stamp(self.alembic_cfg, "head")
 
+    def _head_revision(self) -> str:
+        if is_bundled:
+            return database_revision
+        # development checkout: make sure a new revision file is not skipped because database_revision is outdated
+        revisions, down_revisions = set(), set()
+        versions_path = os.path.join(self.base_path, 'alembic', 'versions')
+        for file_name in os.listdir(versions_path):
+            if not file_name.endswith('.py'):
+                continue
+            with open(os.path.join(versions_path, file_name), encoding='utf-8') as file:
+                content = file.read()
+            revisions.update(re.findall(r"^revision = '(\w+)'", content, re.MULTILINE))
+            down_revisions.update(re.findall(r"^down_revision = '(\w+)'", content, re.MULTILINE))
+        heads = revisions - down_revisions
+        if heads != {database_revision}:
+            logging.warning(f"basic_config.database_revision ({database_revision}) is not the alembic head {heads}")
+        return database_revision if heads == {database_revision} else None
+
     def _upgrade_database(self):
+        start = time.perf_counter()
         with self.engine.connect() as conn:
-            context = MigrationContext.configure(conn)
-            current_rev = context.get_current_revision()
-            if not current_rev:
-                # no revision available -> created before migration was introduced
-                command.stamp(self.alembic_cfg, "440180672239")
+            if sqlalchemy.inspect(conn).has_table('alembic_version'):
+                current_rev = conn.exec_driver_sql("SELECT version_num FROM alembic_version").scalar()
+            else:
+                current_rev = None
+        if current_rev and current_rev == self._head_revision():
+            logging.debug(f"Database already at {current_rev}, alembic skipped ({time.perf_counter() - start:.3f}s)")
+            return
+        from alembic import command
+        if not current_rev:
+            # no revision available -> created before migration was introduced
+            command.stamp(self.alembic_cfg, "440180672239")
         command.upgrade(self.alembic_cfg, "head")
+        logging.debug(f"Database migrated ({time.perf_counter() - start:.3f}s)")
 
     def __bool__(self):
         # check if database is empty :)
@@ -79,6 +398,17 @@ class DatabaseConnector:
             self.session.commit()
             return instance
 
+    def get_or_create_icon(self, data: bytes) -> RegeltestIcon:
+        # looked up by the indexed content hash instead of comparing blobs
+        sha256 = hashlib.sha256(data).hexdigest()
+        icon = self.session.query(RegeltestIcon).where(RegeltestIcon.sha256 == sha256).first()
+        if icon:
+            return icon
+        icon = RegeltestIcon.from_bytes(data)
+        self.session.add(icon)
+        self.session.commit()
+        return icon
+
     def abort(self):
         self.session.rollback()
 
@@ -86,12 +416,14 @@ class DatabaseConnector:
         self.session.commit()
 
     def close_connection(self):
-        self.session.close()
+        self._sessions.remove()
 
     def clear_database(self):
         self.session.close()
         Base.metadata.drop_all(self.engine)
+        self._invalidate_search_cache()
         self.initialized = False
+        self.publish_changes(DatabaseChanges(reset=True))
 
     def add_object(self, datatype_object: Base):
         self.session.add(datatype_object)
@@ -105,25 +437,56 @@ class DatabaseConnector:
         questions = self.session.query(Question).all()
         return questions
 
+    def get_question_count(self) -> int:
+        return self.session.query(func.count(Question.signature)).scalar()
+
+    def iter_questions(self, chunk_size: int = 500) -> Iterator[Question]:
+        # streams all questions (with multiple choice) chunk by chunk through a separate, read-only session,
+        # nothing is kept in the session of the caller
+        with self.session_factory() as session:
+            questions = session.execute(
+                sqlalchemy.select(Question).options(selectinload(Question.multiple_choice))
+                .execution_options(yield_per=chunk_size)).scalars()
+            for question in questions:
+                yield question
+
     def get_question_group(self, question_group_index: int):
         question_group = self.session.query(QuestionGroup).where(QuestionGroup.id == question_group_index).first()
         return question_group
 
     def get_question_multiplechoice(self):
-        return_dict = []
-        for question in self.session.query(Question):
-            return_dict += [
-                (question, self.session.query(MultipleChoice).where(MultipleChoice.question == question).all())]
-        return return_dict
+        questions = self.session.query(Question).options(subqueryload(Question.multiple_choice))
+        return [(question, question.multiple_choice) for question in questions]
 
     def get_question(self, signature: str):
         question = self.session.query(Question).where(Question.signature == signature).first()
         return question
 
+    def get_questions(self, signatures: List[str], preload: bool = False) -> List[Question]:
+        # in the order of signatures, unknown signatures are skipped
+        questions = self.session.query(Question)
+        if preload:
+            questions = questions.options(*self._preload_options())
+        questions = {question.signature: question for question in questions.where(Question.signature.in_(signatures))}
+        return [questions[signature] for signature in signatures if signature in questions]
+
+    @staticmethod
+    def _preload_options():
+        # statistics, multiple choice options and usage counts in a constant number of queries (instead of N+1)
+        usage = RegeltestQuestion.__table__.alias()
+        usage_count = sqlalchemy.select(func.count()).where(usage.c.question_id == Question.signature) \
+            .correlate(Question).scalar_subquery()
+        return (joinedload(Question.statistics),
+                subqueryload(Question.multiple_choice),
+                with_expression(Question.regeltest_usage, usage_count))
+
     def get_questions_by_foreignkey(self, question_groups: List[QuestionGroup], mchoice=None, randomize: bool = False,
-                                    as_query: bool = False) -> Query | List[Question]:
+                                    as_query: bool = False, preload: bool = False,
+                                    order_by: Iterable[ColumnElement] = ()) -> Query | List[Question]:
         question_groups_ids = [question_group.id for question_group in question_groups]
         questions = self.session.query(Question)
+        if preload:
+            questions = questions.options(*self._preload_options())
         # noinspection PyNoneFunctionAssignment
         questions = questions.filter(Question.group_id.in_(question_groups_ids))
         if mchoice is not None:
@@ -133,22 +496,288 @@ class DatabaseConnector:
                 questions = questions.where(Question.answer_index == -1)
         if randomize:
             questions = questions.order_by(func.random())
+        elif order_by:
+            questions = questions.order_by(*order_by)
         if as_query:
             return questions
         else:
             return questions.all()
 
+    def get_question_order(self, question_group_id: int, order_by: Iterable[ColumnElement]) -> List[str]:
+        # signatures of a group in the given order, the (group_id, <column>, signature) indexes answer it without
+        # touching the rows
+        return list(self.session.scalars(sqlalchemy.select(Question.signature)
+                                         .where(Question.group_id == question_group_id).order_by(*order_by)))
+
+    @staticmethod
+    def _fts_match(text: str, columns: Iterable[str]) -> str:
+        # one phrase (quotes escaped by doubling) restricted to the given columns
+        columns = " ".join(column for column in columns if column in question_fts_columns)
+        phrase = text.replace('"', '""')
+        return f'{{{columns}}} : "{phrase}"'
+
+    def search_questions(self, text: str, columns: Iterable[str] = question_fts_columns,
+                         limit: Optional[int] = None) -> List[Question]:
+        # case-insensitive substring search, best matches (bm25) first
+        # the trigram index needs at least three characters, shorter texts fall back to a LIKE scan
+        columns = tuple(columns)
+        if len(text) < 3:
+            condition = sqlalchemy.or_(*[getattr(Question, column).icontains(text, autoescape=True)
+                                         for column in columns])
+            questions = self.session.query(Question).where(condition).order_by(Question.group_id,
+                                                                               Question.question_id)
+            if limit is not None:
+                questions = questions.limit(limit)
+            return questions.all()
+        statement = "SELECT question.signature FROM question_fts " \
+                    "JOIN question ON question.rowid = question_fts.rowid " \
+                    "WHERE question_fts MATCH :match ORDER BY question_fts.rank"
+        parameters = {"match": self._fts_match(text, columns)}
+        if limit is not None:
+            statement += " LIMIT :limit"
+            parameters["limit"] = limit
+        signatures = self.session.execute(sqlalchemy.text(statement), parameters).scalars().all()
+        questions = {question.signature: question for question in
+                     self.session.query(Question).where(Question.signature.in_(signatures))}
+        return [questions[signature] for signature in signatures]
+
+    def search_condition(self, text: str, columns: Iterable[str] = question_fts_columns):
+        # WHERE clause form of search_question_signatures (for queries on question)
+        columns = tuple(columns)
+        if len(text) < 3:
+            return sqlalchemy.or_(*[getattr(Question, column).icontains(text, autoescape=True) for column in columns])
+        return sqlalchemy.text("question.rowid IN (SELECT rowid FROM question_fts WHERE question_fts MATCH :match)") \
+            .bindparams(match=self._fts_match(text, columns))
+
+    def search_question_signatures(self, text: str, columns: Iterable[str] = question_fts_columns) -> Set[str]:
+        # signatures of all questions containing text, cached until the next commit (used for table filters)
+        key = (text, tuple(columns))
+        if key not in self._search_cache:
+            if len(text) < 3:
+                signatures = {question.signature for question in self.search_questions(text, key[1])}
+            else:
+                signatures = set(self.session.execute(
+                    sqlalchemy.text("SELECT question.signature FROM question_fts "
+                                    "JOIN question ON question.rowid = question_fts.rowid "
+                                    "WHERE question_fts MATCH :match"),
+                    {"match": self._fts_match(text, key[1])}).scalars())
+            self._search_cache[key] = signatures
+        return self._search_cache[key]
+
+    def sample_questions(self, sample_sizes: Iterable[Tuple[QuestionGroup, int, int]], seed: Any = None) \
+            -> Dict[Tuple[int, bool], List[Question]]:
+        # (question_group, text count, mchoice count) -> random questions per (group id, mchoice) in one query
+        # every (group, mchoice) partition is numbered in random order and cut by its own limit
+        limits = {}
+        for question_group, text, mchoice in sample_sizes:
+            if text > 0:
+                limits[(question_group.id, False)] = text
+            if mchoice > 0:
+                limits[(question_group.id, True)] = mchoice
+        samples = {key: [] for key in limits}
+        if not limits:
+            return samples
+
+        is_mchoice = (Question.answer_index != -1).label("mchoice")
+        if seed is None:
+            order = func.random()
+        else:
+            order = func.sample_key(str(seed), Question.signature)
+        ranked = sqlalchemy.select(Question.signature, Question.group_id, is_mchoice,
+                                   func.row_number().over(partition_by=(Question.group_id, is_mchoice),
+                                                          order_by=order).label("rank")) \
+            .where(Question.group_id.in_({group_id for group_id, _ in limits})).subquery()
+        selection = sqlalchemy.or_(*[sqlalchemy.and_(ranked.c.group_id == group_id,
+                                                     ranked.c.mchoice == mchoice,
+                                                     ranked.c.rank <= limit)
+                                     for (group_id, mchoice), limit in limits.items()])
+        questions = self.session.query(Question, ranked.c.mchoice) \
+            .join(ranked, Question.signature == ranked.c.signature) \
+            .where(selection).order_by(ranked.c.group_id, ranked.c.mchoice, ranked.c.rank)
+        for question, mchoice in questions:
+            samples[(question.group_id, bool(mchoice))] += [question]
+        return samples
+
     def get_multiplechoice_by_foreignkey(self, question: Question):
         mchoice = self.session.query(MultipleChoice).where(
             MultipleChoice.question == question).all()
         return mchoice
 
-    def fill_database(self, dataset: List[QuestionGroup | Question | MultipleChoice]):
-        # insert processed values into db
+    def fill_database(self, question_groups: Iterable[Dict[str, Any]], questions: Iterable[Dict[str, Any]],
+                      chunk_size: int = 2000) -> ImportReport:
+        # bulk insert of plain row dicts via Core executemany (no ORM instances), one transaction per chunk
+        if not self.initialized:
+            self._init_database()
+            self.initialized = True
+        # the import writes through its own connections, a write transaction left open by the session of this thread
+        # (autoflushed changes) would lock them out until busy_timeout
+        self.session.commit()
+        report = ImportReport()
+        start = time.perf_counter()
+        changes = DatabaseChanges()
+        question_groups = [{"id": question_group["id"], "name": question_group["name"]}
+                           for question_group in question_groups]
+        if question_groups:
+            with self.engine.begin() as connection:
+                connection.execute(insert(QuestionGroup.__table__), question_groups)
+            report.inserted += len(question_groups)
+            changes.inserted_groups.update(question_group["id"] for question_group in question_groups)
+        questions = iter(questions)
+        while chunk := list(itertools.islice(questions, chunk_size)):
+            question_rows, mchoice_rows = self._split_question_rows(chunk)
+            with self.engine.begin() as connection:
+                connection.execute(insert(Question.__table__), question_rows)
+                if mchoice_rows:
+                    connection.execute(insert(MultipleChoice.__table__), mchoice_rows)
+            report.inserted += len(question_rows) + len(mchoice_rows)
+            for row in question_rows:
+                changes.question_inserted(row["signature"], row["group_id"])
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql("ANALYZE")
+        self.session.expire_all()
+        self._invalidate_search_cache()
+        self.publish_changes(changes)
+        report.seconds = time.perf_counter() - start
+        logging.info(f"Bulk import: {report}")
+        return report
+
+    def merge_database(self, question_groups: Iterable[Dict[str, Any]], questions: Iterable[Dict[str, Any]],
+                       chunk_size: int = 2000) -> ImportReport:
+        # upsert instead of clear and refill: statistics and archived regeltests stay linked to their questions
+        # rows are matched by signature, sources without signatures (sr-regeltest.de) by group_id/question_id
+        # questions missing in the new dataset are kept
         if not self.initialized:
             self._init_database()
-        self.session.add_all(dataset)
+            self.initialized = True
+        # the import writes through its own connections, a write transaction left open by the session of this thread
+        # (autoflushed changes) would lock them out until busy_timeout
         self.session.commit()
+        report = ImportReport()
+        start = time.perf_counter()
+
+        with self.engine.begin() as connection:
+            existing_groups = dict(connection.execute(sqlalchemy.select(QuestionGroup.id, QuestionGroup.name)).all())
+            new_groups = []
+            renamed_groups = []
+            for question_group in question_groups:
+                row = {"id": question_group["id"], "name": question_group["name"]}
+                if row["id"] not in existing_groups:
+                    new_groups += [row]
+                elif existing_groups[row["id"]] != row["name"]:
+                    renamed_groups += [{"_id": row["id"], "name": row["name"]}]
+                existing_groups[row["id"]] = row["name"]
+            if new_groups:
+                connection.execute(insert(QuestionGroup.__table__), new_groups)
+            if renamed_groups:
+                connection.execute(sqlalchemy.update(QuestionGroup.__table__)
+                                   .where(QuestionGroup.id == sqlalchemy.bindparam("_id")), renamed_groups)
+            report.inserted += len(new_groups)
+            report.updated += len(renamed_groups)
+            changes = DatabaseChanges(inserted_groups={row["id"] for row in new_groups},
+                                      updated_groups={row["_id"] for row in renamed_groups})
+            existing, signatures_by_id = self._question_index(connection)
+
+        # a question given twice is only merged once, the first row wins (see create_questions)
+        merged = set()
+        questions = iter(questions)
+        while chunk := list(itertools.islice(questions, chunk_size)):
+            new_questions = []
+            changed_questions = []
+            for question in chunk:
+                signature = question.get("signature")
+                if not signature:
+                    signature = signatures_by_id.get((question["group_id"], question["question_id"]))
+                if signature in merged:
+                    report.skipped += 1
+                    continue
+                content = self._question_content(question)
+                if signature not in existing:
+                    signature = signature or uuid.uuid4().hex
+                    new_questions += [dict(question, signature=signature)]
+                elif existing[signature] != content:
+                    changed_questions += [dict(question, signature=signature)]
+                else:
+                    report.unchanged += 1
+                    merged.add(signature)
+                    continue
+                existing[signature] = content
+                signatures_by_id[(question["group_id"], question["question_id"])] = signature
+                merged.add(signature)
+            with self.engine.begin() as connection:
+                if new_questions:
+                    question_rows, mchoice_rows = self._split_question_rows(new_questions)
+                    connection.execute(insert(Question.__table__), question_rows)
+                    if mchoice_rows:
+                        connection.execute(insert(MultipleChoice.__table__), mchoice_rows)
+                if changed_questions:
+                    question_rows, mchoice_rows = self._split_question_rows(changed_questions)
+                    for row in question_rows:
+                        row["_signature"] = row.pop("signature")
+                    connection.execute(sqlalchemy.update(Question.__table__)
+                                       .where(Question.signature == sqlalchemy.bindparam("_signature")),
+                                       question_rows)
+                    connection.execute(sqlalchemy.delete(MultipleChoice.__table__).where(
+                        MultipleChoice.question_signature.in_([row["_signature"] for row in question_rows])))
+                    if mchoice_rows:
+                        connection.execute(insert(MultipleChoice.__table__), mchoice_rows)
+            report.inserted += len(new_questions)
+            report.updated += len(changed_questions)
+            for question in new_questions:
+                changes.question_inserted(question["signature"], question["group_id"])
+            for question in changed_questions:
+                changes.question_updated(question["signature"], question["group_id"])
+
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql("ANALYZE")
+        # the rows were changed behind the back of the ORM session (of this thread, others have to expire their own)
+        self.session.expire_all()
+        self._invalidate_search_cache()
+        self.publish_changes(changes)
+        report.seconds = time.perf_counter() - start
+        logging.info(f"Merge import: {report}")
+        return report
+
+    @staticmethod
+    def _question_content(question: Dict[str, Any]) -> tuple:
+        return (question["group_id"], question["question_id"], question["question"], question["answer_index"],
+                question["answer_text"], question["created"], question["last_edited"],
+                tuple(question["multiple_choice"]))
+
+    def _question_index(self, connection) -> Tuple[Dict[str, tuple], Dict[Tuple[int, int], str]]:
+        mchoice = {}
+        for signature, text in connection.execute(
+                sqlalchemy.select(MultipleChoice.question_signature, MultipleChoice.text)
+                        .order_by(MultipleChoice.question_signature, MultipleChoice.index)):
+            mchoice.setdefault(signature, []).append(text)
+        existing = {}
+        signatures_by_id = {}
+        for row in connection.execute(sqlalchemy.select(
+                Question.signature, Question.group_id, Question.question_id, Question.question,
+                Question.answer_index, Question.answer_text, Question.created, Question.last_edited)):
+            existing[row.signature] = self._question_content(dict(row._mapping,
+                                                                  multiple_choice=mchoice.get(row.signature, [])))
+            signatures_by_id[(row.group_id, row.question_id)] = row.signature
+        return existing, signatures_by_id
+
+    @staticmethod
+    def _split_question_rows(questions: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        question_rows = []
+        mchoice_rows = []
+        for question in questions:
+            signature = question.get("signature") or uuid.uuid4().hex
+            question_rows += [{
+                "signature": signature,
+                "group_id": question["group_id"],
+                "question_id": question["question_id"],
+                "question": question["question"],
+                "answer_index": question["answer_index"],
+                "answer_text": question["answer_text"],
+                "created": question["created"],
+                "last_edited": question["last_edited"],
+            }]
+            mchoice_rows += [{"question_signature": signature, "index": index, "text": text}
+                             for index, text in enumerate(question["multiple_choice"])]
+        return question_rows, mchoice_rows
 
     def delete(self, item: QuestionGroup | Question):
         self.session.delete(item)
@@ -167,21 +796,47 @@ class DatabaseConnector:
             return_val = 1
         return return_val
 
+    def get_question_group_statistics(self, extended: bool = False) -> List[QuestionGroupStatistics]:
+        # one GROUP BY over all groups instead of loading every question just to count it
+        is_text = Question.answer_index == -1
+        columns = [QuestionGroup,
+                   func.count(case((is_text, Question.signature))),
+                   func.count(case((~is_text, Question.signature)))]
+        query = self.session.query(*columns).outerjoin(QuestionGroup.children)
+        if extended:
+            usage = self.session.query(RegeltestQuestion.question_id.label('signature'),
+                                       func.count().label('usage_count')) \
+                .group_by(RegeltestQuestion.question_id).subquery()
+            query = query.add_columns(func.count(Statistics.question_signature),
+                                      func.count(Question.signature) - func.count(Statistics.question_signature),
+                                      func.coalesce(func.sum(usage.c.usage_count), 0))
+            query = query.outerjoin(Statistics, Statistics.question_signature == Question.signature)
+            query = query.outerjoin(usage, usage.c.signature == Question.signature)
+        query = query.group_by(QuestionGroup.id).order_by(QuestionGroup.id)
+        return [QuestionGroupStatistics(*row) for row in query]
+
+    def get_question_counts(self, *conditions) -> Dict[int, int]:
+        # group id -> number of questions (matching all conditions), groups without any are missing
+        query = sqlalchemy.select(Question.group_id, func.count()).where(*conditions).group_by(Question.group_id)
+        return dict(self.session.execute(query).all())
+
     def get_question_group_config(self) -> List[Tuple[QuestionGroup, int, int]]:
-        question_groups = self.get_all_question_groups()
-        return [(question_group,
-                 len(self.get_questions_by_foreignkey(question_groups=[question_group], mchoice=False)),
-                 len(self.get_questions_by_foreignkey(question_groups=[question_group], mchoice=True))) for
-                question_group in
-                question_groups]
+        return [(statistics.question_group, statistics.text_count, statistics.mchoice_count) for statistics in
+                self.get_question_group_statistics()]
 
-    def get_regeltests(self) -> List[Regeltest]:
-        return self.session.query(Regeltest).all()
+    def get_regeltests(self, preload: bool = False) -> List[Regeltest]:
+        regeltests = self.session.query(Regeltest)
+        if preload:
+            regeltests = regeltests.options(
+                subqueryload(Regeltest.selected_questions).joinedload(RegeltestQuestion.question))
+        return regeltests.all()
 
 
 try:
     db = DatabaseConnector(database_path)
 except sqlalchemy.exc.OperationalError as err:
     logging.error(f"{err}\n\nDatabase is corrupt. Deleting the data and recreate it.")
-    os.remove(database_path)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.isfile(database_path + suffix):
+            os.remove(database_path + suffix)
     db = DatabaseConnector(database_path)
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import logging
+from concurrent.futures import ThreadPoolExecutor, Future
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import shiboken6
+from PySide6.QtCore import QObject, Signal
+
+from src.database import db, DatabaseConnector
+
+
+@dataclass(eq=False)
+class DatabaseTask:
+    key: Optional[Hashable]
+    callback: Optional[Callable[[Any], None]] = None
+    error_callback: Optional[Callable[[BaseException], None]] = None
+    future: Optional[Future] = None
+    cancelled: bool = False
+    result: Any = None
+    error: Optional[BaseException] = None
+
+    def cancel(self):
+        self.cancelled = True
+        if self.future is not None:
+            self.future.cancel()
+
+
+class DatabaseExecutor(QObject):
+    # runs database work on background threads, every task gets its own unit of work (session + connection).
+    # callbacks are called on the thread the executor lives in (GUI). Returned objects are detached, db.adopt()
+    # attaches them to the GUI session before they are modified.
+    # a new task with the key of a pending one supersedes it: the old one is cancelled or its result dropped.
+    _completed = Signal(object)
+
+    def __init__(self, connector: DatabaseConnector, max_workers: int = 2, parent=None):
+        super(DatabaseExecutor, self).__init__(parent)
+        self.connector = connector
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="database")
+        self._tasks = {}  # type: Dict[Hashable, DatabaseTask]
+        self._completed.connect(self._deliver)
+
+    def submit(self, key: Optional[Hashable], function: Callable, *args,
+               callback: Optional[Callable[[Any], None]] = None,
+               error_callback: Optional[Callable[[BaseException], None]] = None, **kwargs) -> DatabaseTask:
+        task = DatabaseTask(key, callback, error_callback)
+        if key is not None:
+            self.cancel(key)
+            self._tasks[key] = task
+        task.future = self._pool.submit(self._run, task, function, args, kwargs)
+        return task
+
+    def cancel(self, key: Hashable):
+        task = self._tasks.pop(key, None)
+        if task is not None:
+            task.cancel()
+
+    def pending(self, key: Hashable) -> bool:
+        return key in self._tasks
+
+    def shutdown(self):
+        for key in list(self._tasks):
+            self.cancel(key)
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def _run(self, task: DatabaseTask, function: Callable, args, kwargs):
+        if task.cancelled:
+            return
+        try:
+            with self.connector.unit_of_work():
+                task.result = function(*args, **kwargs)
+        except Exception as err:
+            task.error = err
+        self._completed.emit(task)
+
+    def _deliver(self, task: DatabaseTask):
+        if task.key is not None:
+            if self._tasks.get(task.key) is not task:
+                # superseded
+                return
+            del self._tasks[task.key]
+        if task.cancelled:
+            return
+        callback = task.callback
+        if task.error is not None:
+            callback = task.error_callback
+            if callback is None:
+                logging.error("Database task failed", exc_info=task.error)
+                return
+        if callback is None:
+            return
+        receiver = getattr(callback, '__self__', None)
+        if isinstance(receiver, QObject) and not shiboken6.isValid(receiver):
+            # widget/model was deleted in the meantime
+            return
+        callback(task.error if task.error is not None else task.result)
+
+
+executor = DatabaseExecutor(db)
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import threading
+from typing import Optional
+
+from PySide6.QtCore import QObject, Signal, Qt
+
+from src.database import db, DatabaseConnector, DatabaseChanges
+
+
+class DatabaseNotifier(QObject):
+    # brings the change notifications of the connector (emitted by whatever thread committed) to the GUI thread.
+    # changes committed until the event loop gets to them are merged into a single `changed` emission
+    changed = Signal(object)
+    _scheduled = Signal()
+
+    def __init__(self, connector: DatabaseConnector, parent=None):
+        super(DatabaseNotifier, self).__init__(parent)
+        self.connector = connector
+        self._lock = threading.Lock()
+        self._pending = None  # type: Optional[DatabaseChanges]
+        self._scheduled.connect(self._deliver, Qt.QueuedConnection)
+        connector.add_change_listener(self._collect)
+
+    def _collect(self, changes: DatabaseChanges):
+        with self._lock:
+            schedule = self._pending is None
+            if schedule:
+                self._pending = DatabaseChanges()
+            self._pending.merge(changes)
+        if schedule:
+            self._scheduled.emit()
+
+    def _deliver(self):
+        with self._lock:
+            changes, self._pending = self._pending, None
+        if changes:
+            self.changed.emit(changes)
+
+
+notifier = DatabaseNotifier(db)
@@ -1,18 +1,26 @@
+import hashlib
+import io
+import itertools
 import logging
 import re
 import uuid
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
 from datetime import datetime, date
 from enum import Enum, auto, IntEnum
-from typing import List, Dict
+from typing import List, Dict, Any, Iterable, Iterator, Tuple
 
 import bs4
-from sqlalchemy import Column, Integer, String, ForeignKey, Date, BLOB, DateTime, Boolean
-from sqlalchemy.orm import relationship
+from PIL import Image
+from lxml import etree
+from sqlalchemy import Column, Integer, String, ForeignKey, Date, BLOB, DateTime, Boolean, Index, DDL, event
+from sqlalchemy.orm import relationship, query_expression
 
 from src.basic_config import Base, EagerDefault
 
 default_date = datetime(1970, 1, 1)
+# icons are drawn ~70pt wide in the PDF title, this keeps them sharp when printed
+icon_thumbnail_size = (512, 512)
+_icon_thumbnails = OrderedDict()  # type: OrderedDict[str, Image.Image]
 
 
 class Position(Base):
@@ -56,6 +64,10 @@ class RegeltestDesign(Base):
 
 class RegeltestQuestion(Base):
     __tablename__ = 'regeltest_question'
+    __table_args__ = (
+        Index('ix_regeltest_question_question_id', 'question_id'),
+        Index('ix_regeltest_question_regeltest_id', 'regeltest_id'),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
 
     regeltest_id = Column(String, ForeignKey('regeltest.id'))
@@ -69,13 +81,45 @@ class RegeltestQuestion(Base):
 
 class RegeltestIcon(Base):
     __tablename__ = 'regeltest_icon'
+    __table_args__ = (
+        Index('ix_regeltest_icon_sha256', 'sha256', unique=True),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
-    icon = Column(BLOB, unique=True)
+    # original (encoded) image file, deduplicated by its sha256
+    # icons stored before revision 9e4c2b7d5a31 are raw pixels with unknown size (format 'raw')
+    icon = Column(BLOB)
+    sha256 = Column(String)
+    width = Column(Integer)
+    height = Column(Integer)
+    mode = Column(String)
+    format = Column(String)
     regeltests = relationship("Regeltest", back_populates="icon")
 
+    @staticmethod
+    def from_bytes(data: bytes) -> 'RegeltestIcon':
+        image = Image.open(io.BytesIO(data))
+        return RegeltestIcon(icon=data, sha256=hashlib.sha256(data).hexdigest(), width=image.width,
+                             height=image.height, mode=image.mode, format=image.format)
+
+    def thumbnail(self) -> Image.Image:
+        # decoded once per content, the last few are kept for the next documents
+        image = _icon_thumbnails.get(self.sha256)
+        if image is not None:
+            _icon_thumbnails.move_to_end(self.sha256)
+            return image
+        image = Image.open(io.BytesIO(self.icon))
+        image.thumbnail(icon_thumbnail_size)
+        _icon_thumbnails[self.sha256] = image
+        if len(_icon_thumbnails) > 8:
+            _icon_thumbnails.popitem(last=False)
+        return image
+
 
 class Regeltest(Base):
     __tablename__ = 'regeltest'
+    __table_args__ = (
+        Index('ix_regeltest_icon_id', 'icon_id'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     uuid = Column(String, default=(lambda: uuid.uuid4().hex))
@@ -95,6 +139,11 @@ class Regeltest(Base):
 
 class Statistics(Base):
     __tablename__ = 'statistics'
+    __table_args__ = (
+        # 6-level mode filters by level and last_tested, prioritize-new mode orders by last_tested
+        Index('ix_statistics_level_last_tested', 'level', 'last_tested'),
+        Index('ix_statistics_last_tested', 'last_tested'),
+    )
 
     question_signature = Column(String, ForeignKey("question.signature"), primary_key=True)
     question = relationship("Question", back_populates="statistics")
@@ -182,6 +231,13 @@ class FilterOption(Enum):
 
 class Question(Base):
     __tablename__ = 'question'
+    __table_args__ = (
+        # group (+ multiple choice) selection; covers the per-group counts including the signature joins
+        Index('ix_question_group_id_answer_index', 'group_id', 'answer_index', 'signature'),
+        # ordered reads of a group (default sort columns of the question table)
+        Index('ix_question_group_id_question_id', 'group_id', 'question_id', 'signature'),
+        Index('ix_question_group_id_last_edited', 'group_id', 'last_edited', 'signature'),
+    )
 
     QuestionValues = namedtuple('QuestionValues', ['table_value', 'table_tooltip', 'table_checkbox'],
                                 defaults=[None, None])
@@ -191,6 +247,8 @@ class Question(Base):
     multiple_choice = relationship("MultipleChoice", back_populates="question", cascade="all, delete-orphan")
     regeltest_questions = relationship("RegeltestQuestion", back_populates="question")
     statistics = relationship("Statistics", back_populates="question", cascade="all, delete-orphan", uselist=False)
+    # only populated by preloaded queries (see DatabaseConnector.get_questions_by_foreignkey)
+    regeltest_usage = query_expression()
 
     group_id = Column(Integer, ForeignKey('question_group.id'))
     question_id = Column(Integer, default=-1)
@@ -246,8 +304,11 @@ class Question(Base):
                                                               FilterOption.equal), datatype=int),
     }  # type: Dict[str, QuestionParameters]
 
-    # noinspection PyArgumentList
     def values(self, key) -> QuestionValues:
+        return self.all_values()[key]
+
+    # noinspection PyArgumentList
+    def all_values(self) -> Dict[str, QuestionValues]:
         return {
             'group_id': Question.QuestionValues(table_value=self.group_id),
             'question_id': Question.QuestionValues(table_value=self.question_id),
@@ -265,8 +326,13 @@ class Question(Base):
             'positive_tests': Question.QuestionValues(table_value=self._statistics('positive_tests')),
             'negative_tests': Question.QuestionValues(table_value=self._statistics('negative_tests')),
             'streak': Question.QuestionValues(table_value=self._statistics('streak')),
-            'regeltest_count': Question.QuestionValues(table_value=len(self.regeltest_questions))
-        }[key]
+            'regeltest_count': Question.QuestionValues(table_value=self._regeltest_count())
+        }
+
+    def _regeltest_count(self):
+        if self.regeltest_usage is not None:
+            return self.regeltest_usage
+        return len(self.regeltest_questions)
 
     def _statistics(self, key):
         if not self.statistics:
@@ -305,16 +371,53 @@ class Question(Base):
                f", question_id={self.group_id!r} {self.question_id!r})"
 
 
-def create_question_groups(groups: bs4.element.Tag) -> List[QuestionGroup]:
+# full text index over question and answer (trigram tokenizer -> case-insensitive substring search)
+# kept in sync by triggers, created together with the question table (alembic revision 0b7e3f5a9c14)
+question_fts_columns = ('question', 'answer_text')
+question_fts_ddl = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS question_fts USING fts5("
+    "question, answer_text, content='question', content_rowid='rowid', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS question_fts_insert AFTER INSERT ON question BEGIN "
+    "INSERT INTO question_fts(rowid, question, answer_text) VALUES (new.rowid, new.question, new.answer_text); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS question_fts_delete AFTER DELETE ON question BEGIN "
+    "INSERT INTO question_fts(question_fts, rowid, question, answer_text) "
+    "VALUES ('delete', old.rowid, old.question, old.answer_text); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS question_fts_update AFTER UPDATE OF question, answer_text ON question BEGIN "
+    "INSERT INTO question_fts(question_fts, rowid, question, answer_text) "
+    "VALUES ('delete', old.rowid, old.question, old.answer_text); "
+    "INSERT INTO question_fts(rowid, question, answer_text) VALUES (new.rowid, new.question, new.answer_text); "
+    "END",
+]
+for statement in question_fts_ddl:
+    event.listen(Question.__table__, 'after_create', DDL(statement))
+event.listen(Question.__table__, 'before_drop', DDL("DROP TABLE IF EXISTS question_fts"))
+
+
+_mchoice_prefix = re.compile(r"^[abc] *\( *\) *")
+_answer_candidates = (re.compile(r" *\(*a\)* *"), re.compile(r" *\(*b\)* *"), re.compile(r" *\(*c\)* *"))
+_answer_prefix = re.compile(r"^ *\(*[abc] *\)* *")
+rule_fields = ("LNR", "SIGNATUR", "FRAGE", "MCHOICE", "ANTWORT", "ERST", "AEND")
+
+
+def create_question_groups(groups: bs4.element.Tag) -> List[Dict[str, Any]]:
     texts = groups.find_all("GRUPPENTEXT")
     texts = [item.contents[0].strip() for item in texts]
     numbers = groups.find_all("GRUPPENNR")
     numbers = [int(item.contents[0]) for item in numbers]
 
-    return [QuestionGroup(id=number, name=text) for text, number in zip(texts, numbers)]
+    return [{"id": number, "name": text} for text, number in zip(texts, numbers)]
+
+
+def create_questions_and_mchoice(rules_xml) -> List[Dict[str, Any]]:
+    # plain row dicts (see DatabaseConnector.fill_database), the multiple choice texts are nested per question
+    return list(create_questions({field: rule.find(field).contents[0] for field in rule_fields}
+                                 for rule in rules_xml))
 
 
-def create_questions_and_mchoice(rules_xml):
+def create_questions(rules: Iterable[Dict[str, str]]) -> Iterator[Dict[str, Any]]:
+    # raw REGELSATZ field texts -> question row dicts, duplicates (by number or signature) are skipped
     def create_mchoice(mchoice_):
         if not mchoice_:
             # empty -> no mchoice question
@@ -327,60 +430,94 @@ def create_questions_and_mchoice(rules_xml):
         assert len(
             mchoice_cleaned) == 3, f"More than three possible answers?! Wtf.. '{mchoice_}' v. '{mchoice_cleaned}'"
         # removes the a/b/c () in front :)
-        return [re.sub(r"^[abc] *\( *\) *", "", i) for i in mchoice_cleaned]
-
-    rules_index = []
-    signatures = []
-    rules = []
-    multiple_choice = []
-    for rule in rules_xml:
-        lnr = rule.find("LNR").contents[0].strip()
+        return [_mchoice_prefix.sub("", i) for i in mchoice_cleaned]
+
+    rules_index = set()
+    signatures = set()
+    for rule in rules:
+        lnr = rule["LNR"].strip()
         group_id = int(lnr[0:2])
         question_id = int(lnr[2:])
-        signature = rule.find("SIGNATUR").contents[0].strip()
+        signature = rule["SIGNATUR"].strip()
         if (group_id, question_id) in rules_index:
             # duplicated questions... wtf
             continue
-        else:
-            rules_index += [(group_id, question_id)]
+        rules_index.add((group_id, question_id))
         if signature in signatures:
             # duplicate question... again
             continue
-        else:
-            signatures += [signature]
-        question = rule.find("FRAGE").contents[0].strip()
-        mchoice = create_mchoice(rule.find("MCHOICE").contents[0])
-        mchoice = [MultipleChoice(question_signature=signature, index=i, text=mchoice) for i, mchoice in
-                   enumerate(mchoice)]
-        answer = rule.find("ANTWORT").contents[0].strip()
+        signatures.add(signature)
+        question = rule["FRAGE"].strip()
+        mchoice = create_mchoice(rule["MCHOICE"])
+        answer = rule["ANTWORT"].strip()
         if not mchoice:
             mchoice_index = -1
         else:
-            if re.match(r" *\(*a\)* *", answer):
-                mchoice_index = 0
-            elif re.match(r" *\(*b\)* *", answer):
-                mchoice_index = 1
-            elif re.match(r" *\(*c\)* *", answer):
-                mchoice_index = 2
+            for mchoice_index, candidate in enumerate(_answer_candidates):
+                if candidate.match(answer):
+                    break
             else:
                 logging.info(f"{question} is multiple choice, but has no answer candidate.. choice is ignored")
                 mchoice_index = -1
                 mchoice = []
-        multiple_choice += mchoice
         if mchoice_index >= 0:
-            answer = re.sub(r"^ *\(*[abc] *\)* *", "", answer)
-        created = rule.find("ERST").contents[0].strip()
-        changed = rule.find("AEND").contents[0].strip()
+            answer = _answer_prefix.sub("", answer)
+        created = rule["ERST"].strip()
+        changed = rule["AEND"].strip()
         if created:
-            created = datetime.strptime(rule.find("ERST").contents[0].strip(), "%d.%m.%Y")
+            created = datetime.strptime(created, "%d.%m.%Y").date()
         else:
-            created = default_date
+            created = default_date.date()
         if changed:
-            changed = datetime.strptime(rule.find("AEND").contents[0].strip(), "%d.%m.%Y")
+            changed = datetime.strptime(changed, "%d.%m.%Y").date()
             if changed < created:
                 changed = created
         else:
             changed = created
-        rules += [Question(question_id=question_id, group_id=group_id, question=question, answer_index=mchoice_index,
-                           answer_text=answer, created=created, last_edited=changed, signature=signature)]
-    return rules, multiple_choice
+        yield {"group_id": group_id, "question_id": question_id, "question": question,
+               "answer_index": mchoice_index, "answer_text": answer, "created": created, "last_edited": changed,
+               "signature": signature, "multiple_choice": mchoice}
+
+
+def iterparse_origformat(source, batch_size: int = 1000) \
+        -> Tuple[List[Dict[str, Any]], Iterator[List[Dict[str, Any]]]]:
+    # streaming alternative to BeautifulSoup + read_in_origformat for large DFB files: the groups are read
+    # right away, the questions are parsed lazily in batches. Handled elements are freed, memory stays flat
+    context = etree.iterparse(source, events=("end",), tag=("GRUPPEN", "REGELSATZ"), huge_tree=True)
+
+    def free(element):
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+    def rule_texts(element) -> Dict[str, str]:
+        texts = {field: "" for field in rule_fields}
+        for child in element:
+            texts[child.tag] = child.text or ""
+        return texts
+
+    question_groups = []
+    early_rules = []
+    for _, element in context:
+        if element.tag == "GRUPPEN":
+            question_groups = [{"id": int(group.findtext("GRUPPENNR")),
+                                "name": group.findtext("GRUPPENTEXT").strip()}
+                               for group in element.iter("GRUPPE")]
+            free(element)
+            break
+        # rules before the groups (not the case in DFB files)
+        early_rules += [rule_texts(element)]
+        free(element)
+
+    def rules():
+        yield from early_rules
+        for _, rule in context:
+            yield rule_texts(rule)
+            free(rule)
+
+    def batches():
+        questions = create_questions(rules())
+        while batch := list(itertools.islice(questions, batch_size)):
+            yield batch
+
+    return question_groups, batches()
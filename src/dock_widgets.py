@@ -7,14 +7,13 @@ import webbrowser
 from typing import TYPE_CHECKING
 
 import pptx
-from PIL import Image
 from PySide6.QtCore import Qt, Signal
 from PySide6.QtWidgets import QWidget, QDialog, QApplication, QListWidgetItem, QListWidget
 
 from src import document_builder
 from src.basic_config import base_path
 from src.database import db
-from src.datatypes import Regeltest, RegeltestIcon, SelfTestMode
+from src.datatypes import Regeltest, SelfTestMode
 from src.regeltestcreator import RegeltestSetup, RegeltestSaveDialog
 from src.ui_regeltest_creator_dockwidget import Ui_regeltest_creator_dockwidget
 from src.ui_self_test_dockwidget import Ui_self_test_dockwidget
@@ -92,9 +91,7 @@ class RegeltestCreatorDockwidget(QWidget, Ui_regeltest_creator_dockwidget):
                 self.ui.regeltest_list.add_question(question)
 
     def create_regeltest(self):
-        questions = []
-        for signature in self.ui.regeltest_list.questions:
-            questions += [db.get_question(signature)]
+        questions = db.get_questions(self.ui.regeltest_list.questions)
         settings = RegeltestSaveDialog(questions, self)
         settings.ui.title_edit.setFocus()
         result = settings.exec()
@@ -106,8 +103,9 @@ class RegeltestCreatorDockwidget(QWidget, Ui_regeltest_creator_dockwidget):
             selected_questions = settings.get_questions()
             QApplication.setOverrideCursor(Qt.WaitCursor)
             if settings.ui.icon_path_edit.text():
-                icon = Image.open(settings.ui.icon_path_edit.text())
-                icon_db = db.get_or_create(RegeltestIcon, icon=icon.tobytes())
+                with open(settings.ui.icon_path_edit.text(), 'rb') as file:
+                    icon_db = db.get_or_create_icon(file.read())
+                icon = icon_db.thumbnail()
             else:
                 icon = None
                 icon_db = None
@@ -230,9 +228,13 @@ class SelfTestDockWidget(QWidget, Ui_self_test_dockwidget):
         self.ui.question_visibility_spinbox.valueChanged.connect(self.timer_question)
         self.ui.auto_evaluate_spinbox.valueChanged.connect(self.timer_answer)
 
-        self._question_groups = db.get_all_question_groups()
-        for question in self._question_groups:
-            item = QListWidgetItem(f"{question.id:02d} - {question.name}")
+        self._question_groups = []
+        for statistics in db.get_question_group_statistics(extended=True):
+            question_group = statistics.question_group
+            self._question_groups += [question_group]
+            item = QListWidgetItem(f"{question_group.id:02d} - {question_group.name}")
+            item.setToolTip(f"{statistics.text_count + statistics.mchoice_count} Fragen "
+                            f"({statistics.untested_count} noch nicht getestet)")
             item.setCheckState(Qt.Unchecked)
             self.ui.self_test_question_groups.addItem(item)
 
@@ -1,17 +1,17 @@
 from datetime import datetime, date
-from typing import Dict, Tuple, Callable, Any, Optional
+from typing import Dict, Optional, Any
 
 from PySide6.QtCore import Qt
 from PySide6.QtWidgets import QDialog, QLineEdit, QCheckBox, QDateEdit, QSpinBox, QPushButton, QDialogButtonBox
 
-from src.datatypes import Question, FilterOption
+from src.datatypes import Question
+from src.question_filter import QuestionFilter
 from src.ui_filter_editor import Ui_FilterEditor
 
 
 class FilterEditor(QDialog, Ui_FilterEditor):
     def __init__(self, filter_configuration: Dict[str, Question.QuestionParameters],
-                 current_filter: Optional[Tuple[str, FilterOption, Any]] = None,
-                 # dict_key, FilterOption, filter_data
+                 current_filter: Optional[QuestionFilter] = None,
                  parent=None, window_flags=Qt.Dialog):
         super(FilterEditor, self).__init__(parent, window_flags)
         self.ui = Ui_FilterEditor()
@@ -126,39 +126,6 @@ class FilterEditor(QDialog, Ui_FilterEditor):
 
         return dict_key, parameters, filter_option
 
-    def current_configuration(self) -> Tuple[str, FilterOption, Any]:
+    def current_configuration(self) -> QuestionFilter:
         dict_key, _, filter_option = self.__current_selection_state()
-        return dict_key, filter_option, self.__get_filter_data()
-
-    def create_filter(self) -> Tuple[str, Callable]:
-        # ('answer_text', lambda x: 'FaD' in x)
-        dict_key, parameters, filter_option = self.__current_selection_state()
-
-        value = self.__get_filter_data()
-        if filter_option == FilterOption.smaller_equal:
-            def filter_callable(x):
-                return value >= x
-        elif filter_option == FilterOption.smaller:
-            def filter_callable(x):
-                return value > x
-        elif filter_option == FilterOption.larger_equal:
-            def filter_callable(x):
-                return value <= x
-        elif filter_option == FilterOption.larger:
-            def filter_callable(x):
-                return value < x
-        elif filter_option == FilterOption.equal:
-            def filter_callable(x):
-                return value == x
-        elif filter_option == FilterOption.contains:
-            def filter_callable(x):
-                return value.lower() in x.lower()
-        else:
-            raise ValueError('Invalid FilterOption!')
-
-        def extended_filter(x):
-            if not x:
-                return False
-            return filter_callable(x)
-
-        return dict_key, extended_filter
+        return QuestionFilter(dict_key, filter_option, self.__get_filter_data())
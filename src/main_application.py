@@ -1,16 +1,21 @@
 import datetime
+import functools
+import gzip
+import itertools
 import json
+import os
+import re
 from enum import Enum, auto, IntEnum
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple, Optional, Callable, TextIO, Iterator, Iterable
 
 from PySide6.QtCore import QCoreApplication, Qt
-from PySide6.QtWidgets import QMainWindow, QWidget, QFileDialog, QApplication, QMessageBox, QDialog
+from PySide6.QtWidgets import QMainWindow, QWidget, QFileDialog, QApplication, QMessageBox, QDialog, QProgressDialog
 from bs4 import BeautifulSoup
 
 from src.basic_config import app_version, check_for_update, display_name, is_bundled
 from src.database import db
 from src.dataset_downloader import DatasetDownloadDialog
-from src.datatypes import create_question_groups, create_questions_and_mchoice, QuestionGroup, Question, MultipleChoice
+from src.datatypes import create_question_groups, create_questions_and_mchoice, iterparse_origformat
 from src.dock_widgets import RegeltestCreatorDockwidget, SelfTestDockWidget
 from src.main_widgets import FirstSetupWidget, QuestionOverviewWidget, SelfTestWidget
 from src.regeltest_management import PreviousRegeltests
@@ -30,44 +35,179 @@ class ApplicationMode(IntEnum):
     regeltest_setup = 3
 
 
-def read_in_sr_regeltest_de(json_content: Dict[str, Any]):
+@functools.lru_cache(maxsize=4096)
+def parse_sr_regeltest_de_date(value: str) -> datetime.date:
+    # exports share few distinct dates, every one is parsed once
+    return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def create_sr_regeltest_de_question(question: Dict[str, Any]) -> Dict[str, Any]:
+    answer_text = question["answer_text"]
+    answer_index = question["answer_index"]
+    if question["multiple_choice"]:
+        answer_text = question["multiple_choice"][answer_index]
+    return {
+        "group_id": question["group_id"],
+        "question_id": question["question_id"],
+        "question": question["question"],
+        "answer_index": answer_index,
+        "answer_text": answer_text,
+        "created": parse_sr_regeltest_de_date(question["created"]),
+        "last_edited": parse_sr_regeltest_de_date(question["last_edited"]),
+        # sr-regeltest.de exports carry no signature -> generated on insert
+        "signature": question.get("signature"),
+        "multiple_choice": list(question["multiple_choice"])
+    }
+
+
+def read_in_sr_regeltest_de(json_content: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
     question_groups = []
     questions = []
     for question_group in json_content["question_groups"]:
-        question_groups += [QuestionGroup(
-            id=question_group["id"],
-            name=question_group["name"]
-        )]
+        question_groups += [{
+            "id": question_group["id"],
+            "name": question_group["name"]
+        }]
     for question in json_content["questions"]:
-        multiple_choice = []
-        answer_text = question["answer_text"]
-        answer_index = question["answer_index"]
-        if question["multiple_choice"]:
-            for i, answer_option in enumerate(question["multiple_choice"]):
-                multiple_choice += [MultipleChoice(index=i, text=answer_option)]
-            answer_text = multiple_choice[answer_index].text
-        questions += [Question(
-            group_id=question["group_id"],
-            question_id=question["question_id"],
-            question=question["question"],
-            answer_index=answer_index,
-            answer_text=answer_text,
-            created=datetime.datetime.strptime(question["created"], '%Y-%m-%d').date(),
-            last_edited=datetime.datetime.strptime(question["last_edited"], '%Y-%m-%d').date(),
-            multiple_choice=multiple_choice
-        )]
+        questions += [create_sr_regeltest_de_question(question)]
     return question_groups, questions
 
 
+class JSONStreamReader:
+    # incremental reader for a top-level JSON object: the members listed in `streamed` have to be arrays and are
+    # decoded element by element (raw_decode on a sliding buffer), only one element is in memory at a time
+    whitespace = re.compile(r"[ \t\n\r]*")
+    # what could still follow a number in the next chunk (e.g. "1500" + ".0")
+    number_continuation = re.compile(r"[0-9.eE+-]*\Z")
+    end_of_array = object()
+    # characters of a single value, bounds the buffer for malformed input (e.g. an unterminated string)
+    max_value_size = 1 << 26
+
+    def __init__(self, file: TextIO, buffer_size: int = 1 << 16):
+        self.file = file
+        self.buffer_size = buffer_size
+        self.buffer = ""
+        self.position = 0
+        self.characters_read = 0
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self, size: int = 0) -> bool:
+        chunk = self.file.read(max(size, self.buffer_size))
+        if not chunk:
+            return False
+        self.characters_read += len(chunk)
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def _peek(self) -> str:
+        while True:
+            self.position = self.whitespace.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self._fill():
+                return ""
+
+    def _expect(self, characters: str) -> str:
+        character = self._peek()
+        if not character or character not in characters:
+            raise ValueError(f"Invalid JSON: expected one of {characters!r} at character "
+                             f"{self.characters_read - len(self.buffer) + self.position}, got {character!r}")
+        self.position += 1
+        return character
+
+    def _value(self) -> Any:
+        while True:
+            self._peek()
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError as error:
+                # only a value running into the end of the buffer may be completed by the next chunk, anything else
+                # is malformed. The chunk is as big as the incomplete value so far (re-decoding stays linear)
+                incomplete = error.msg.startswith("Unterminated string") or len(self.buffer) - error.pos <= 16
+                pending = len(self.buffer) - self.position
+                if incomplete and pending > self.max_value_size:
+                    raise ValueError(f"Invalid JSON: value at character "
+                                     f"{self.characters_read - len(self.buffer) + self.position} exceeds "
+                                     f"{self.max_value_size} characters") from error
+                if not incomplete or not self._fill(pending):
+                    raise
+                continue
+            if type(value) in (int, float) and self.number_continuation.match(self.buffer, end) and self._fill():
+                # the number could continue in the next chunk
+                continue
+            self.position = end
+            return value
+
+    def members(self, streamed: Iterable[str]) -> Iterator[Tuple[str, Any]]:
+        # (key, element) for the streamed arrays followed by (key, end_of_array), (key, value) for other members
+        streamed = set(streamed)
+        self._expect("{")
+        if self._peek() == "}":
+            return
+        while True:
+            key = self._value()
+            self._expect(":")
+            if key in streamed:
+                self._expect("[")
+                if self._peek() == "]":
+                    self.position += 1
+                else:
+                    while True:
+                        yield key, self._value()
+                        if self._expect(",]") == "]":
+                            break
+                yield key, self.end_of_array
+            else:
+                yield key, self._value()
+            if self._expect(",}") == "}":
+                return
+
+
+def stream_sr_regeltest_de(file: TextIO, batch_size: int = 2000,
+                           progress: Optional[Callable[[int], None]] = None) \
+        -> Tuple[List[Dict[str, Any]], Iterator[List[Dict[str, Any]]]]:
+    # streaming alternative to json.load + read_in_sr_regeltest_de: the groups are read right away, the questions
+    # lazily in batches (progress gets the number of characters read so far). The file has to stay open until the
+    # batches are consumed
+    reader = JSONStreamReader(file)
+    members = reader.members(("question_groups", "questions"))
+    question_groups = []
+    # questions before the groups (not the case in exports) have to be kept until the groups are complete
+    early_questions = []
+    for key, value in members:
+        if key == "question_groups":
+            if value is JSONStreamReader.end_of_array:
+                break
+            question_groups += [{"id": value["id"], "name": value["name"]}]
+        elif key == "questions" and value is not JSONStreamReader.end_of_array:
+            early_questions += [value]
+
+    def questions():
+        yield from early_questions
+        for key_, value_ in members:
+            if key_ == "questions" and value_ is not JSONStreamReader.end_of_array:
+                yield value_
+
+    def batches():
+        raw_questions = questions()
+        while batch := list(itertools.islice(raw_questions, batch_size)):
+            yield [create_sr_regeltest_de_question(question) for question in batch]
+            if progress:
+                progress(reader.characters_read)
+
+    return question_groups, batches()
+
+
 def read_in_origformat(soup_content: BeautifulSoup):
     question_groups = create_question_groups(soup_content.find("GRUPPEN"))
-    questions, mchoice = create_questions_and_mchoice(soup_content("REGELSATZ"))
-    return question_groups, questions, mchoice
+    questions = create_questions_and_mchoice(soup_content("REGELSATZ"))
+    return question_groups, questions
 
 
 def load_file_dataset(parent: QWidget, reset_cursor=True) -> bool:
     datasets = []
-    filter_sr_regeltest_de = "sr-regeltest.de Export (*.json)"
+    filter_sr_regeltest_de = "sr-regeltest.de Export (*.json *.json.gz)"
     filter_orig = "DFB Regeldaten (*.xml)"
     file_name = QFileDialog.getOpenFileName(parent, caption="Fragendatei öffnen",
                                             filter=f"{filter_sr_regeltest_de};;{filter_orig}")
@@ -75,16 +215,25 @@ def load_file_dataset(parent: QWidget, reset_cursor=True) -> bool:
         return False
     QApplication.setOverrideCursor(Qt.WaitCursor)
     if file_name[1] == filter_orig:
-        with open(file_name[0], 'rb') as file:
-            soup_content = BeautifulSoup(file, "lxml-xml")
-        datasets = read_in_origformat(soup_content)
+        # parsed while it is imported, the file is never completely in memory
+        question_groups, question_batches = iterparse_origformat(file_name[0])
+        datasets = question_groups, itertools.chain.from_iterable(question_batches)
     elif file_name[1] == filter_sr_regeltest_de:
-        with open(file_name[0], 'r', encoding='utf-8') as file:
-            json_content = json.load(file)
-        datasets = read_in_sr_regeltest_de(json_content)
-    db.clear_database()
-    for dataset in datasets:
-        db.fill_database(dataset)
+        compressed = file_name[0].endswith(".gz")
+        # progress in bytes of the file read so far (the characters the reader counts are fewer with umlauts),
+        # busy indicator for compressed files
+        progress_dialog = QProgressDialog("Fragen werden importiert...", None, 0,
+                                          0 if compressed else os.path.getsize(file_name[0]), parent)
+        progress_dialog.setWindowModality(Qt.WindowModal)
+        progress_dialog.setMinimumDuration(500)
+        opener = gzip.open if compressed else open
+        with opener(file_name[0], 'rt', encoding='utf-8') as file:
+            question_groups, question_batches = stream_sr_regeltest_de(
+                file, progress=lambda _: progress_dialog.setValue(min(file.buffer.tell(), progress_dialog.maximum())))
+            db.merge_database(question_groups, itertools.chain.from_iterable(question_batches))
+        progress_dialog.close()
+    if datasets:
+        db.merge_database(*datasets)
     if reset_cursor:
         QApplication.restoreOverrideCursor()
     return True
@@ -94,9 +243,7 @@ def load_online_dataset(parent: QWidget, reset_cursor=True) -> bool:
     dataset_downloader = DatasetDownloadDialog(parent)
     if dataset_downloader.exec() == QDialog.Accepted:
         datasets = read_in_sr_regeltest_de(dataset_downloader.data)
-        db.clear_database()
-        for dataset in datasets:
-            db.fill_database(dataset)
+        db.merge_database(*datasets)
         if reset_cursor:
             QApplication.restoreOverrideCursor()
         return True
@@ -104,22 +251,44 @@ def load_online_dataset(parent: QWidget, reset_cursor=True) -> bool:
         return False
 
 
+def write_dataset(file: TextIO, progress: Optional[Callable[[int, int], None]] = None, chunk_size: int = 500):
+    # streams the export chunk by chunk, the output is identical to json.dump() of the complete dataset
+    question_groups = [question_group.export() for question_group in db.get_all_question_groups()]
+    total = db.get_question_count()
+    file.write('{"question_groups": ')
+    json.dump(question_groups, file)
+    file.write(', "questions": [')
+    for index, question in enumerate(db.iter_questions(chunk_size)):
+        if index:
+            file.write(', ')
+        file.write(json.dumps(question.export()))
+        if progress and (index + 1) % chunk_size == 0:
+            progress(index + 1, total)
+    file.write(']}')
+    if progress:
+        progress(total, total)
+
+
 def save_dataset(parent: QWidget):
-    file_name = QFileDialog.getSaveFileName(parent, caption="Fragendatei speichern", filter="DFB Regeldaten (*.json)")
+    filter_json = "DFB Regeldaten (*.json)"
+    filter_gzip = "DFB Regeldaten, komprimiert (*.json.gz)"
+    file_name = QFileDialog.getSaveFileName(parent, caption="Fragendatei speichern",
+                                            filter=f"{filter_json};;{filter_gzip}")
     if len(file_name) == 0 or file_name[0] == "":
         return
     QApplication.setOverrideCursor(Qt.WaitCursor)
-    question_groups = []
-    questions = []
-    for question_group in db.get_all_question_groups():
-        question_groups += [question_group.export()]
-    for question in db.get_all_questions():
-        questions += [question.export()]
-    with open(file_name[0], "w+") as file:
-        json.dump({
-            "question_groups": question_groups,
-            "questions": questions
-        }, file)
+    progress_dialog = QProgressDialog("Fragen werden exportiert...", None, 0, 0, parent)
+    progress_dialog.setWindowModality(Qt.WindowModal)
+    progress_dialog.setMinimumDuration(500)
+
+    def update_progress(done: int, total: int):
+        progress_dialog.setMaximum(total)
+        progress_dialog.setValue(done)
+
+    opener = gzip.open if file_name[1] == filter_gzip or file_name[0].endswith(".gz") else open
+    with opener(file_name[0], "wt", encoding="utf-8") as file:
+        write_dataset(file, update_progress)
+    progress_dialog.close()
     QApplication.restoreOverrideCursor()
 
 
@@ -197,10 +366,11 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             display_update_dialog(self, releases)
 
     def initialize(self):
-        dataset = db.get_all_question_groups()
+        dataset = db.get_question_group_statistics()
         if dataset:
-            for question_group in dataset:
-                self.question_overview.create_question_group_tab(question_group)
+            for statistics in dataset:
+                self.question_overview.create_question_group_tab(statistics.question_group,
+                                                                 statistics.text_count + statistics.mchoice_count)
             self.set_mode(ApplicationMode.question_overview, reset=True)
         else:
             self.set_mode(ApplicationMode.initial_setup, reset=True)
@@ -210,7 +380,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             load_file_dataset(self, reset_cursor=False)
         else:
             load_online_dataset(self, reset_cursor=False)
-        self.question_overview.reset()
+        # the question tables apply the imported rows themselves (change notifications)
         QApplication.restoreOverrideCursor()
 
     def add_question_group(self):
@@ -223,6 +393,9 @@ class MainWindow(QMainWindow, Ui_MainWindow):
     def set_mode(self, mode: ApplicationMode, reset=False):
         if self.ui.stackedWidget.currentIndex() == int(mode) and not reset:
             return
+        self.self_test.statistics_buffer.flush()
+        if mode != ApplicationMode.self_test:
+            self.self_test.statistics_buffer.release_snapshot()
 
         self.ui.stackedWidget.setCurrentIndex(int(mode))
         self.ui.stacked_widget_dock.setCurrentIndex(int(mode))
@@ -1,23 +1,31 @@
 from __future__ import annotations
 
 import datetime
+import time
 from enum import Enum, auto
-from typing import List, Tuple, Dict
+from typing import List, Dict, Tuple
 from typing import TYPE_CHECKING, Optional
 
-from PySide6.QtCore import Signal, QSortFilterProxyModel, QTimer
+from PySide6.QtCore import Signal, QTimer, QObject
 from PySide6.QtGui import QKeySequence, QShortcut, Qt
 from PySide6.QtWidgets import QWidget, QListView, QMessageBox, QDialog, QDialogButtonBox, QListWidgetItem, \
     QTreeWidgetItem, QTableWidget, QGridLayout, QTableWidgetItem, QStyle
 from sqlalchemy import func, nullsfirst, or_
+from sqlalchemy.orm import joinedload, Session
+from sqlalchemy.sql import ColumnElement
 
 from src import main_application
-from src.database import db
+from src.basic_config import statistics_flush_interval, statistics_flush_size, self_test_snapshot, \
+    tab_release_timeout
+from src.database import db, QuestionGroupStatistics, DatabaseSnapshot, DatabaseChanges
+from src.database_executor import executor
+from src.database_notifier import notifier
 from src.datatypes import Question, Statistics, SelfTestMode
 from src.datatypes import QuestionGroup
 from src.dock_widgets import SelfTestDockWidget
 from src.filter_editor import FilterEditor
-from src.question_table import RuleSortFilterProxyModel, QuestionGroupTableView, QuestionGroupDataModel
+from src.question_filter import filter_conditions
+from src.question_table import RuleSortFilterProxyModel, QuestionGroupDataModel, QuestionGroupTab
 from src.ui_first_setup_widget import Ui_FirstSetupWidget
 from src.ui_question_group_editor import Ui_QuestionGroupEditor
 from src.ui_question_overview_widget import Ui_QuestionOverviewWidget
@@ -86,11 +94,17 @@ class QuestionOverviewWidget(QWidget, Ui_QuestionOverviewWidget):
         self.ui.filter_list.itemDoubleClicked.connect(self.add_filter)
         self.ui.add_filter.clicked.connect(self.add_filter)
 
-        self.question_group_tabs = []  # type: List[Tuple[QuestionGroup, QSortFilterProxyModel, QuestionGroupDataModel]]
+        self.question_group_tabs = []  # type: List[QuestionGroupTab]
         self.questions = {}  # type: Dict[QTreeWidgetItem, str]
 
         self.old_index = self.ui.tabWidget.currentIndex()
         self.ui.tabWidget.currentChanged.connect(self.handle_bad_scrolling)
+        # the models update their rows themselves, only the tabs are managed here
+        notifier.changed.connect(self.apply_changes)
+        self.release_timer = QTimer(self)
+        self.release_timer.setInterval(60 * 1000)
+        self.release_timer.timeout.connect(self.release_unused_tabs)
+        self.release_timer.start()
 
     def handle_bad_scrolling(self, new_index: int):
         if not self.ui.tabWidget.isTabVisible(new_index):
@@ -137,26 +151,83 @@ class QuestionOverviewWidget(QWidget, Ui_QuestionOverviewWidget):
         msgBox.setDefaultButton(QMessageBox.Cancel)
         ret = msgBox.exec()
         if ret == QMessageBox.Yes:
-            question_group, _, _ = self.question_group_tabs[index_tabwidget]
-            self.question_group_tabs.pop(index_tabwidget)
-            db.delete(question_group)
+            tab = self.question_group_tabs.pop(index_tabwidget)
+            db.delete(tab.question_group)
             self.ui.tabWidget.removeTab(index_tabwidget)
+            tab.deleteLater()
 
         if not self.question_group_tabs:
             self.main_window.initialize()
 
-    def create_question_group_tab(self, question_group: QuestionGroup):
-        tab = QWidget()
-        view = QuestionGroupTableView(tab)
-        model = QuestionGroupDataModel(question_group, view)
-        filter_model = RuleSortFilterProxyModel()
-        filter_model.setSourceModel(model)
-        view.setModel(filter_model)
-        view.sortByColumn(0, Qt.AscendingOrder)
-        self.question_group_tabs.append((question_group, filter_model, model))
+    def create_question_group_tab(self, question_group: QuestionGroup, question_count: int = 0):
+        # the table is only created when the tab is shown (or filtered) for the first time
+        tab = QuestionGroupTab(question_group, question_count)
+        tab.materialized.connect(lambda: self._connect_tab(tab))
+        self.question_group_tabs.append(tab)
         self.ui.tabWidget.addTab(tab, "")
         self._update_tabtitle(self.ui.tabWidget.indexOf(tab))
 
+    def _connect_tab(self, tab: QuestionGroupTab):
+        def update_tab():
+            self._update_tabtitle(self.ui.tabWidget.indexOf(tab))
+            if RuleSortFilterProxyModel.filters:
+                self._update_tab_visibility(tab)
+
+        def filter_applied(_):
+            self._update_tabtitle(self.ui.tabWidget.indexOf(tab))
+            self._update_tab_visibility(tab)
+
+        tab.model.rowsInserted.connect(update_tab)
+        tab.model.rowsRemoved.connect(update_tab)
+        tab.model.modelReset.connect(update_tab)
+        tab.filter_model.rowsInserted.connect(update_tab)
+        tab.filter_model.rowsRemoved.connect(update_tab)
+        tab.filter_model.modelReset.connect(update_tab)
+        tab.filter_model.filter_applied.connect(filter_applied)
+
+    def _update_tab_visibility(self, tab: QuestionGroupTab):
+        row_count = tab.hit_count
+        if row_count is None:
+            if RuleSortFilterProxyModel.filters:
+                # decided once the filters are evaluated (or the rows are there)
+                return
+            row_count = tab.row_count
+        self.ui.tabWidget.setTabVisible(self.ui.tabWidget.indexOf(tab), row_count != 0)
+
+    def release_unused_tabs(self):
+        deadline = time.monotonic() - tab_release_timeout
+        current_tab = self.ui.tabWidget.currentWidget()
+        for tab in self.question_group_tabs:
+            if tab is not current_tab and tab.last_shown < deadline:
+                tab.release()
+
+    def update_question_counts(self):
+        # aggregate counts for the tabs without a model
+        if any(tab.model is None for tab in self.question_group_tabs):
+            conditions = filter_conditions(RuleSortFilterProxyModel.filters)
+            executor.submit(('question_counts', id(self)), QuestionOverviewWidget.read_question_counts,
+                            RuleSortFilterProxyModel.filter_version, conditions, callback=self.set_question_counts)
+
+    @staticmethod
+    def read_question_counts(filter_version: int, conditions: List[ColumnElement]) \
+            -> Tuple[int, Dict[int, int], Optional[Dict[int, int]]]:
+        # runs on the database executor
+        return filter_version, db.get_question_counts(), db.get_question_counts(*conditions) if conditions else None
+
+    def set_question_counts(self, question_counts: Tuple[int, Dict[int, int], Optional[Dict[int, int]]]):
+        filter_version, counts, filtered_counts = question_counts
+        if filter_version != RuleSortFilterProxyModel.filter_version:
+            # counted for filters which were changed in the meantime
+            return
+        for index, tab in enumerate(self.question_group_tabs):
+            if tab.model is None:
+                tab.question_count = counts.get(tab.question_group.id, 0)
+                self._update_tabtitle(index)
+                if filtered_counts is not None:
+                    tab.filtered_count = filtered_counts.get(tab.question_group.id, 0)
+                    self._update_tabtitle(index)
+                    self._update_tab_visibility(tab)
+
     def _question_group_editor(self, question_group: QuestionGroup | None,
                                editor: QuestionGroupEditor) -> EditorResult:
         if editor.exec() == QDialog.Accepted:
@@ -174,7 +245,7 @@ class QuestionOverviewWidget(QWidget, Ui_QuestionOverviewWidget):
     def rename_question_group(self, index):
         if not self.question_group_tabs:
             return
-        question_group, _, _ = self.question_group_tabs[index]
+        question_group = self.question_group_tabs[index].question_group
         editor = QuestionGroupEditor(id=question_group.id, name=question_group.name)
         result = self._question_group_editor(question_group, editor)
         while result == EditorResult.Invalid:
@@ -201,8 +272,11 @@ class QuestionOverviewWidget(QWidget, Ui_QuestionOverviewWidget):
             self.create_question_group_tab(question_group)
 
     def _update_tabtitle(self, index):
-        question_group, _, _ = self.question_group_tabs[index]
-        self.ui.tabWidget.setTabText(index, f"{question_group.id:02d} {question_group.name}")
+        if index == -1:
+            return
+        tab = self.question_group_tabs[index]
+        count = tab.row_count if tab.hit_count is None else f"{tab.hit_count}/{tab.row_count}"
+        self.ui.tabWidget.setTabText(index, f"{tab.question_group.id:02d} {tab.question_group.name} ({count})")
 
     def add_filter(self, list_entry: QListWidgetItem | bool = False):
         if not list_entry or type(list_entry) == bool:
@@ -212,7 +286,7 @@ class QuestionOverviewWidget(QWidget, Ui_QuestionOverviewWidget):
         else:
             # Edit mode -> Doubleclick on existing entry!
             index = self.ui.filter_list.indexFromItem(list_entry).row()
-            current_configuration = RuleSortFilterProxyModel.filters[index][1]
+            current_configuration = RuleSortFilterProxyModel.filters[index]
             edit_mode = True
         properties = {}
         for name, visible in QuestionGroupDataModel.headers:
@@ -229,15 +303,13 @@ class QuestionOverviewWidget(QWidget, Ui_QuestionOverviewWidget):
                 self.__delete_filter(index)
         elif editor.result == QDialogButtonBox.ButtonRole.AcceptRole:
             # Closed via Save
-            dict_key, filter_option, filter_value = editor.current_configuration()
+            question_filter = editor.current_configuration()
             if not edit_mode:
-                RuleSortFilterProxyModel.filters += [(editor.create_filter(), (dict_key, filter_option, filter_value))]
-                self.ui.filter_list.addItem(
-                    QListWidgetItem(f"{properties[dict_key].table_header} {filter_option} '{filter_value}'"))
+                RuleSortFilterProxyModel.filters += [question_filter]
+                self.ui.filter_list.addItem(QListWidgetItem(str(question_filter)))
             else:
-                RuleSortFilterProxyModel.filters[index] = (
-                    editor.create_filter(), (dict_key, filter_option, filter_value))
-                list_entry.setText(f"{properties[dict_key].table_header} {filter_option} '{filter_value}'")
+                RuleSortFilterProxyModel.filters[index] = question_filter
+                list_entry.setText(str(question_filter))
         elif editor.result == QDialogButtonBox.ButtonRole.RejectRole:
             # Closed via Cancel
             return
@@ -249,20 +321,65 @@ class QuestionOverviewWidget(QWidget, Ui_QuestionOverviewWidget):
         self.refresh_column_filter()
 
     def refresh_column_filter(self):
-        for index, (_, filter_model, _) in enumerate(self.question_group_tabs):
-            filter_model = filter_model  # type: RuleSortFilterProxyModel
-            filter_model.invalidateFilter()
-            self.ui.tabWidget.setTabVisible(index, filter_model.rowCount() != 0)
-
-    def create_ruletabs(self, question_groups: List[QuestionGroup]):
+        # evaluated in the background, the current tab first. Tabs keep their previous result until theirs arrives
+        # (filter_applied, set_question_counts), evaluations of replaced filters are superseded.
+        RuleSortFilterProxyModel.filters_changed()
+        current_tab = self.ui.tabWidget.currentWidget()
+        for tab in sorted(self.question_group_tabs, key=lambda other_tab: other_tab is not current_tab):
+            if tab.filter_model is not None:
+                tab.filter_model.evaluate()
+        if RuleSortFilterProxyModel.filters:
+            # tabs without loaded rows are counted by the database
+            self.update_question_counts()
+            return
+        # a pending count of the previous filters must not hide tabs anymore
+        executor.cancel(('question_counts', id(self)))
+        for index, tab in enumerate(self.question_group_tabs):
+            if tab.model is None:
+                tab.filtered_count = None
+                self._update_tabtitle(index)
+                self._update_tab_visibility(tab)
+
+    def create_ruletabs(self, question_groups: List[QuestionGroupStatistics]):
         self.ui.tabWidget.setTabsClosable(True)
         self.ui.add_filter.setDisabled(False)
-        for question_group in question_groups:
-            self.create_question_group_tab(question_group)
+        for statistics in question_groups:
+            self.create_question_group_tab(statistics.question_group,
+                                           statistics.text_count + statistics.mchoice_count)
 
     def reset(self):
-        for (_, _, model) in self.question_group_tabs:
-            model.reset()
+        for tab in self.question_group_tabs:
+            if tab.model is not None:
+                tab.model.reset()
+        self.update_question_counts()
+
+    def apply_changes(self, changes: DatabaseChanges):
+        if not self.question_group_tabs:
+            # initial setup, MainWindow.initialize creates the tabs
+            return
+        deleted_groups = set(changes.deleted_groups)
+        new_groups = set(changes.inserted_groups)
+        if changes.reset:
+            existing_groups = {question_group.id for question_group in db.get_all_question_groups()}
+            deleted_groups |= {tab.question_group.id for tab in self.question_group_tabs} - existing_groups
+            new_groups |= existing_groups
+        for index in range(len(self.question_group_tabs) - 1, -1, -1):
+            if self.question_group_tabs[index].question_group.id in deleted_groups:
+                self.question_group_tabs.pop(index).deleteLater()
+                self.ui.tabWidget.removeTab(index)
+        if not self.question_group_tabs:
+            self.main_window.initialize()
+            return
+        for index, tab in enumerate(self.question_group_tabs):
+            if tab.question_group.id in changes.updated_groups:
+                self._update_tabtitle(index)
+            new_groups.discard(tab.question_group.id)
+        for group_id in sorted(new_groups):
+            question_group = db.get_question_group(group_id)
+            if question_group is not None:
+                self.create_question_group_tab(question_group)
+        if changes.reset or changes.inserted or changes.updated or changes.deleted:
+            self.update_question_counts()
 
 
 class FirstSetupWidget(QWidget, Ui_FirstSetupWidget):
@@ -315,6 +432,62 @@ class Timer:
         self.current_value = self.init_value
 
 
+class StatisticsBuffer(QObject):
+    # write-behind for self-test answers: the statistics are changed right away (the widget shows them) but written
+    # together, so drilling through questions does not wait for the disk on every answer. The objects are detached
+    # (or belong to the snapshot), the GUI session never holds them: an autoflush in between would keep a write
+    # transaction open until the next flush and block imports and background writes.
+    def __init__(self, parent=None, interval: int = statistics_flush_interval, size: int = statistics_flush_size):
+        super(StatisticsBuffer, self).__init__(parent)
+        self.size = size
+        self.pending = 0
+        # in-memory snapshot mode: the changed statistics are upserted to the file instead of committing the session
+        self.snapshot = None  # type: Optional[DatabaseSnapshot]
+        self.changed_statistics = set()
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(interval * 1000)
+        self.timer.timeout.connect(self.flush)
+
+    @staticmethod
+    def statistics(question: Question) -> Statistics:
+        if not question.statistics:
+            # column defaults are only applied on insert, but the counters are used before
+            question.statistics = Statistics(question_signature=question.signature, continous_solved_count=0, level=0,
+                                             correct_solved=0, wrong_solved=0)
+        return question.statistics
+
+    def changed(self, statistics: Statistics):
+        self.pending += 1
+        self.changed_statistics.add(statistics)
+        if self.timer.interval() <= 0 or self.pending >= self.size:
+            self.flush()
+        elif not self.timer.isActive():
+            self.timer.start()
+
+    def flush(self):
+        self.timer.stop()
+        if not self.pending:
+            return
+        if self.snapshot is not None:
+            self.snapshot.write_statistics(self.changed_statistics)
+        else:
+            db.write_statistics(self.changed_statistics)
+        self.changed_statistics.clear()
+        self.pending = 0
+
+    def start_snapshot(self):
+        self.release_snapshot()
+        self.snapshot = db.snapshot()
+
+    def release_snapshot(self):
+        if self.snapshot is None:
+            return
+        self.flush()
+        self.snapshot.close()
+        self.snapshot = None
+
+
 class SelfTestWidget(QWidget, Ui_SelfTestWidget):
     def __init__(self, main_window: MainWindow, dock_widget: SelfTestDockWidget):
         super(SelfTestWidget, self).__init__(main_window)
@@ -341,6 +514,8 @@ class SelfTestWidget(QWidget, Ui_SelfTestWidget):
         self.time_question = Timer(0)  # type: Timer
         self.time_answer = Timer(0)  # type: Timer
 
+        self.statistics_buffer = StatisticsBuffer(self)
+
         self.current_question = None  # type: Optional[Question]
         self.previous_questions = []
         self.next_questions = []
@@ -380,6 +555,8 @@ class SelfTestWidget(QWidget, Ui_SelfTestWidget):
 
     @current_question.setter
     def current_question(self, value):
+        # questions are loaded in the background (detached) or from the snapshot, answers are written by the
+        # statistics buffer
         self._current_question = value
         self.ui.switch_eval_button.setDisabled(not value)
         self.ui.user_answer_test.setDisabled(not value)
@@ -456,26 +633,24 @@ class SelfTestWidget(QWidget, Ui_SelfTestWidget):
         self.ui.stackedWidget.setCurrentIndex(1)
 
     def correct_answered(self):
-        if not self.current_question.statistics:
-            self.current_question.statistics = Statistics()
-            db.commit()
-        self.current_question.statistics.correct_solved += 1
-        self.current_question.statistics.continous_solved_count += 1
-        self.current_question.statistics.last_tested = datetime.datetime.now()
+        statistics = self.statistics_buffer.statistics(self.current_question)
+        statistics.correct_solved += 1
+        statistics.continous_solved_count += 1
+        statistics.last_tested = datetime.datetime.now()
         if self.dock_widget.mode == SelfTestMode.random:
             pass
         elif self.dock_widget.mode == SelfTestMode.level:
             # if level is 7 -> never re-asked!
-            self.current_question.statistics.level += 1
+            statistics.level += 1
         elif self.dock_widget.mode == SelfTestMode.prioritize_new:
             pass
         else:
             raise ValueError("Not supported mode.")
 
-        if self.current_question.statistics.level == 0:
-            self.current_question.statistics.level = 1
+        if statistics.level == 0:
+            statistics.level = 1
 
-        db.commit()
+        self.statistics_buffer.changed(statistics)
 
         self.dock_widget.unlock()
         # remove correct question from stack
@@ -484,21 +659,19 @@ class SelfTestWidget(QWidget, Ui_SelfTestWidget):
         self.ui.stackedWidget.setCurrentIndex(0)
 
     def incorrect_answered(self):
-        if not self.current_question.statistics:
-            self.current_question.statistics = Statistics()
-            db.commit()
-        self.current_question.statistics.wrong_solved += 1
-        self.current_question.statistics.continous_solved_count = 0
-        self.current_question.statistics.last_tested = datetime.datetime.now()
+        statistics = self.statistics_buffer.statistics(self.current_question)
+        statistics.wrong_solved += 1
+        statistics.continous_solved_count = 0
+        statistics.last_tested = datetime.datetime.now()
         if self.dock_widget.mode == SelfTestMode.random:
             pass
         elif self.dock_widget.mode == SelfTestMode.level:
-            self.current_question.statistics.level = max(self.current_question.statistics.level - 1, 0)
+            statistics.level = max(statistics.level - 1, 0)
         elif self.dock_widget.mode == SelfTestMode.prioritize_new:
             pass
         else:
             raise ValueError("Not supported mode.")
-        db.commit()
+        self.statistics_buffer.changed(statistics)
 
         self.dock_widget.unlock()
         # move wrong question to the end
@@ -508,17 +681,37 @@ class SelfTestWidget(QWidget, Ui_SelfTestWidget):
         self.ui.stackedWidget.setCurrentIndex(0)
 
     def selected_groups_changed(self):
-        questions = db.get_questions_by_foreignkey(self.dock_widget.get_question_groups(), as_query=True)
+        question_group_ids = [question_group.id for question_group in self.dock_widget.get_question_groups()]
+        snapshot = self.statistics_buffer.snapshot
+        if snapshot is not None:
+            # in-memory, already contains the latest answers
+            self.set_questions(self.read_questions(question_group_ids, self.dock_widget.mode, snapshot.session))
+            return
+        # the background query has to see the latest answers (level / prioritize new modes)
+        self.statistics_buffer.flush()
+        # rapid toggling in the dock supersedes the pending query
+        executor.submit('self_test_questions', SelfTestWidget.read_questions, question_group_ids,
+                        self.dock_widget.mode, callback=self.set_questions)
 
-        if self.dock_widget.mode == SelfTestMode.random:
-            questions = self.prepare_random_mode(questions)
-        elif self.dock_widget.mode == SelfTestMode.level:
-            questions = self.prepare_level_mode(questions)
-        elif self.dock_widget.mode == SelfTestMode.prioritize_new:
-            questions = self.prepare_prioritize_new(questions)
+    @staticmethod
+    def read_questions(question_group_ids: List[int], mode: SelfTestMode,
+                       session: Optional[Session] = None) -> List[Question]:
+        # runs on the database executor (or on the snapshot session)
+        session = session or db.session
+        questions = session.query(Question) \
+            .options(joinedload(Question.statistics), joinedload(Question.question_group)) \
+            .filter(Question.group_id.in_(question_group_ids))
+
+        if mode == SelfTestMode.random:
+            return SelfTestWidget.prepare_random_mode(questions)
+        elif mode == SelfTestMode.level:
+            return SelfTestWidget.prepare_level_mode(questions)
+        elif mode == SelfTestMode.prioritize_new:
+            return SelfTestWidget.prepare_prioritize_new(questions)
         else:
             raise ValueError("Not supported mode.")
 
+    def set_questions(self, questions: List[Question]):
         self.update_progressbar(0, len(questions))
 
         self.previous_questions = []
@@ -636,6 +829,8 @@ class SelfTestWidget(QWidget, Ui_SelfTestWidget):
         self.ui.time_progressbar.setDisabled(True)
 
     def reset(self):
+        if self_test_snapshot:
+            self.statistics_buffer.start_snapshot()
         self.dock_widget.reset()
         self.dock_widget.unlock()
         self.ui.stackedWidget.setCurrentIndex(0)
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import copy
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+source_directory = os.path.dirname(os.path.abspath(__file__))
+explainable_statements = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+_whitespace = re.compile(r"\s+")
+_string_literal = re.compile(r"'(?:[^']|'')*'")
+_number_literal = re.compile(r"\b\d+(?:\.\d+)?\b")
+_parameter_list = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+def normalize_statement(statement: str) -> str:
+    # statements differing only in literals or in the length of IN (...) lists are aggregated together
+    statement = _whitespace.sub(" ", statement).strip()
+    statement = _string_literal.sub("?", statement)
+    statement = _number_literal.sub("?", statement)
+    return _parameter_list.sub("(?, ...)", statement)
+
+
+@dataclass
+class QueryStatistics:
+    statement: str
+    count: int = 0
+    total: float = 0
+    max: float = 0
+    # only known for writes, SQLite reports no row count for SELECT before the rows are fetched
+    rows: int = 0
+    slow: int = 0
+    call_sites: Counter = field(default_factory=Counter)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0
+
+    def __str__(self):
+        call_site = self.call_sites.most_common(1)[0][0] if self.call_sites else "?"
+        return f"{self.count}x {self.total * 1000:.1f} ms " \
+               f"(mean {self.mean * 1000:.2f} ms, max {self.max * 1000:.1f} ms), {self.rows} rows, " \
+               f"{call_site}: {self.statement}"
+
+
+class QueryProfiler:
+    # times every statement of an engine (before/after_cursor_execute), aggregated by normalised SQL.
+    # statements slower than slow_threshold (seconds) are written to the slow query log with their query plan
+    def __init__(self, engine: Engine, slow_threshold: float, log_path: Optional[str] = None):
+        self.engine = engine
+        self.slow_threshold = slow_threshold
+        self._lock = threading.Lock()
+        self._statistics = {}  # type: Dict[str, QueryStatistics]
+        self._explained = set()
+
+        self.slow_log = logging.getLogger(__name__)
+        if log_path and not any(getattr(handler, 'baseFilename', None) == os.path.abspath(log_path)
+                                for handler in self.slow_log.handlers):
+            handler = logging.FileHandler(log_path, encoding='utf-8', delay=True)
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            self.slow_log.addHandler(handler)
+
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def remove(self):
+        event.remove(self.engine, "before_cursor_execute", self._before_cursor_execute)
+        event.remove(self.engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def snapshot(self) -> List[QueryStatistics]:
+        # most expensive statements (total time) first
+        with self._lock:
+            statistics = [copy.deepcopy(statistics) for statistics in self._statistics.values()]
+        return sorted(statistics, key=lambda item: item.total, reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._statistics.clear()
+            self._explained.clear()
+
+    @staticmethod
+    def _call_site() -> str:
+        # innermost caller in the application sources (not sqlalchemy or this module), e.g. database.py:123
+        frame = sys._getframe(2)
+        call_sites = []
+        while frame is not None and len(call_sites) < 2:
+            filename = frame.f_code.co_filename
+            if filename.startswith(source_directory) and not filename.endswith("query_profiler.py"):
+                call_sites += [f"{os.path.basename(filename)}:{frame.f_lineno} {frame.f_code.co_name}"]
+            frame = frame.f_back
+        return " < ".join(call_sites) if call_sites else "?"
+
+    def _before_cursor_execute(self, connection, cursor, statement, parameters, context, executemany):
+        connection.info.setdefault("query_start", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, connection, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - connection.info["query_start"].pop()
+        rows = max(cursor.rowcount, 0)
+        normalized = normalize_statement(statement)
+        call_site = self._call_site()
+        slow = duration >= self.slow_threshold
+        with self._lock:
+            statistics = self._statistics.get(normalized)
+            if statistics is None:
+                statistics = self._statistics[normalized] = QueryStatistics(normalized)
+            statistics.count += 1
+            statistics.total += duration
+            statistics.max = max(statistics.max, duration)
+            statistics.rows += rows
+            statistics.call_sites[call_site] += 1
+            statistics.slow += slow
+            explain = slow and normalized not in self._explained
+            if explain:
+                self._explained.add(normalized)
+        if slow:
+            message = f"slow query {duration * 1000:.1f} ms, {rows} rows, {call_site}\n    {statement}"
+            if explain:
+                message += "".join(f"\n    {line}" for line in self._query_plan(cursor, statement, parameters,
+                                                                             executemany))
+            self.slow_log.warning(message)
+
+    @staticmethod
+    def _query_plan(cursor, statement: str, parameters, executemany: bool) -> List[str]:
+        if not statement.lstrip().upper().startswith(explainable_statements):
+            return []
+        if executemany:
+            parameters = parameters[0] if parameters else ()
+        # separate cursor, the original one may still hold unfetched rows
+        plan_cursor = cursor.connection.cursor()
+        try:
+            plan_cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters or ())
+            return [f"QUERY PLAN {row[-1]}" for row in plan_cursor.fetchall()]
+        except sqlite3.Error as err:
+            return [f"QUERY PLAN not available: {err}"]
+        finally:
+            plan_cursor.close()
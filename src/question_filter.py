@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import operator
+from typing import NamedTuple, Any, Dict, List, Sequence, Optional
+
+import sqlalchemy
+from sqlalchemy import func
+from sqlalchemy.sql import ColumnElement
+
+from src.database import db
+from src.datatypes import Question, FilterOption, Statistics, RegeltestQuestion, question_fts_columns
+
+_comparisons = {
+    FilterOption.smaller_equal: operator.le,
+    FilterOption.smaller: operator.lt,
+    FilterOption.larger_equal: operator.ge,
+    FilterOption.larger: operator.gt,
+    FilterOption.equal: operator.eq,
+}
+_statistics_columns = {
+    'last_tested': Statistics.last_tested,
+    'positive_tests': Statistics.correct_solved,
+    'negative_tests': Statistics.wrong_solved,
+    'streak': Statistics.continous_solved_count,
+}
+
+
+def sql_column(column: str) -> ColumnElement:
+    # SQL expression of a table column (key of Question.parameters), also used to sort large groups in the database
+    if column == 'multiple_choice':
+        return Question.answer_index != -1
+    if column in _statistics_columns:
+        statistics = sqlalchemy.select(_statistics_columns[column]) \
+            .where(Statistics.question_signature == Question.signature).scalar_subquery()
+        if column == 'last_tested':
+            return statistics
+        # questions without statistics show 0
+        return func.coalesce(statistics, 0)
+    if column == 'regeltest_count':
+        return sqlalchemy.select(func.count()).where(RegeltestQuestion.question_id == Question.signature) \
+            .scalar_subquery()
+    return getattr(Question, column)
+
+
+class QuestionFilter(NamedTuple):
+    # one filter of the question table: <column> <option> <value>, column is a key of Question.parameters.
+    # condition() is the SQL form (counts of tabs without loaded rows), evaluate() the one for the cached columns
+    # of a loaded model. Both treat missing values (None, e.g. never tested) as not matching, 0 or '' do match
+    column: str
+    option: FilterOption
+    value: Any
+
+    def __str__(self):
+        return f"{Question.parameters[self.column].table_header} {self.option} '{self.value}'"
+
+    def condition(self) -> ColumnElement:
+        if self.option == FilterOption.contains:
+            if self.column in question_fts_columns:
+                return db.search_condition(self.value, (self.column,))
+            return sql_column(self.column).icontains(self.value, autoescape=True)
+        return _comparisons[self.option](sql_column(self.column), self.value)
+
+    def evaluate(self, columns: Dict[str, Sequence[Any]]) -> bytearray:
+        # one byte (0/1) per row of the cached column values
+        if self.option == FilterOption.contains and self.column in question_fts_columns:
+            matches = db.search_question_signatures(self.value, (self.column,))
+            return bytearray(map(matches.__contains__, columns['signature']))
+        values = columns[self.column]
+        if self.column == 'multiple_choice':
+            # the table shows the letter of the answer (None for text questions), the filter value is a bool
+            values = [value is not None for value in values]
+        if self.option == FilterOption.contains:
+            text = self.value.lower()
+            return bytearray(value is not None and text in value.lower() for value in values)
+        compare = _comparisons[self.option]
+        filter_value = self.value
+        return bytearray(value is not None and compare(value, filter_value) for value in values)
+
+
+def filter_conditions(filters: List[QuestionFilter]) -> List[ColumnElement]:
+    return [question_filter.condition() for question_filter in filters]
+
+
+def evaluate_filters(filters: List[QuestionFilter], columns: Dict[str, Sequence[Any]], row_count: int) \
+        -> Optional[bytearray]:
+    # rows matching all filters, None without filters. The byte arrays are combined as big integers (bitwise and)
+    if not filters:
+        return None
+    result = None
+    for question_filter in filters:
+        matches = int.from_bytes(question_filter.evaluate(columns), 'little')
+        result = matches if result is None else result & matches
+    return bytearray(result.to_bytes(row_count, 'little'))
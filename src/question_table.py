@@ -1,19 +1,85 @@
 from __future__ import annotations
 
 import datetime
-from typing import Any, List
+import itertools
+import time
+from typing import Any, List, Dict, Optional, Set, Tuple
 
 import PySide6
-from PySide6.QtCore import Qt, QPoint, QAbstractTableModel, QSortFilterProxyModel
-from PySide6.QtGui import QAction, QDrag, QShortcut, QKeySequence
+from PySide6.QtCore import Qt, QPoint, QAbstractTableModel, QSortFilterProxyModel, QModelIndex, Signal
+from PySide6.QtGui import QAction, QDrag, QShortcut, QKeySequence, QShowEvent, QHideEvent
 from PySide6.QtWidgets import QTreeWidget, QVBoxLayout, QDialog, QMessageBox, QMenu, QListView, QTableView, \
     QStyledItemDelegate, QWidget
+from sqlalchemy.sql import ColumnElement
 
-from src.database import db
+from src.basic_config import sql_sort_threshold
+from src.database import db, DatabaseChanges
+from src.database_executor import executor
+from src.database_notifier import notifier
 from src.datatypes import Question
+from src.question_filter import QuestionFilter, evaluate_filters, sql_column
 from src.question_editor import QuestionEditor
 
-dict_key = str
+SortRole = Qt.UserRole + 1
+
+
+def sort_key(value: Any) -> tuple:
+    # None (e.g. never tested) sorts before every value and never gets compared with it
+    if value is None:
+        return (0,)
+    return 1, value
+
+
+class ColumnCache:
+    # column-oriented copy of the values shown in the table, one list entry per row
+    __slots__ = ('value', 'display', 'tooltip', 'check_state', 'sort_key')
+
+    def __init__(self):
+        self.value = []  # type: List[Any]
+        self.display = []  # type: List[Any]
+        self.tooltip = []  # type: List[Optional[str]]
+        self.check_state = []  # type: List[Optional[int]]
+        self.sort_key = []  # type: List[tuple]
+
+    @staticmethod
+    def _entries(question_values: Question.QuestionValues) -> tuple:
+        value = question_values.table_value
+        display = value
+        if type(value) == datetime.date or type(value) == datetime.datetime:
+            display = str(value)
+        tooltip = question_values.table_tooltip
+        if tooltip is not None:
+            tooltip = str(tooltip)
+        return value, display, tooltip, question_values.table_checkbox, sort_key(value)
+
+    def insert(self, row: int, question_values: Question.QuestionValues):
+        value, display, tooltip, check_state, key = ColumnCache._entries(question_values)
+        self.value.insert(row, value)
+        self.display.insert(row, display)
+        self.tooltip.insert(row, tooltip)
+        self.check_state.insert(row, check_state)
+        self.sort_key.insert(row, key)
+
+    def replace(self, row: int, question_values: Question.QuestionValues):
+        value, display, tooltip, check_state, key = ColumnCache._entries(question_values)
+        self.value[row] = value
+        self.display[row] = display
+        self.tooltip[row] = tooltip
+        self.check_state[row] = check_state
+        self.sort_key[row] = key
+
+    def pop(self, row: int):
+        self.value.pop(row)
+        self.display.pop(row)
+        self.tooltip.pop(row)
+        self.check_state.pop(row)
+        self.sort_key.pop(row)
+
+    def reorder(self, rows: List[int]):
+        # rows: the previous row of every new row
+        for name in ColumnCache.__slots__:
+            values = getattr(self, name)
+            setattr(self, name, [values[row] for row in rows])
 
 
 class QuestionGroupDataModel(QAbstractTableModel):
@@ -44,21 +110,247 @@ class QuestionGroupDataModel(QAbstractTableModel):
                ('negative_tests', False),
                ('streak', False)]
     activated_headers = [question for (question, question_bool) in headers if question_bool]
+    # signature is not displayed, but filters may target it (full text search results)
+    cached_keys = [key for key, _ in headers] + ['signature']
 
-    def __init__(self, question_group, parent):
+    # more changed rows than this are reloaded completely
+    incremental_update_limit = 500
+    # columns large groups are sorted by in the database, indexed together with group_id (the proxy sorts the rest)
+    sql_sort_columns = ('question_id', 'last_edited')
+
+    # the rows were permuted (layout change), argument: the previous row of every row
+    rows_reordered = Signal(object)
+    # a single cached row was inserted (or replaced, second argument) / removed, emitted before the views learn it
+    row_cached = Signal(int, bool)
+    row_uncached = Signal(int)
+
+    def __init__(self, question_group, parent, sql_sort: bool = False):
         super(QuestionGroupDataModel, self).__init__(parent)
         self.question_group = question_group
+        # large groups are sorted by the database (see sort()), the proxy keeps the order of the rows.
+        # sort_order is None while the proxy sorts
+        self.sql_sort = sql_sort
+        self.sort_order = ('question_id', Qt.AscendingOrder)  # type: Optional[Tuple[str, Qt.SortOrder]]
         self.questions = []  # type: List[Question]
-        self.read_data()
+        self.columns = {key: ColumnCache() for key in QuestionGroupDataModel.cached_keys}
+        # signature -> row of the cached rows
+        self._rows = {}  # type: Dict[str, int]
+        # signatures of changed rows which are currently read in the background
+        self._changed_signatures = set()  # type: Set[str]
+        # incremented with every change of the cached rows (invalidates the filter results)
+        self.data_version = 0
+        notifier.changed.connect(self.apply_changes)
+        self.reset()
+
+    @staticmethod
+    def read_data(question_group_id: int, order_by: List[ColumnElement]) -> List[Question]:
+        # runs on the database executor
+        return db.get_questions_by_foreignkey([db.get_question_group(question_group_id)], preload=True,
+                                              order_by=order_by)
+
+    @property
+    def sql_ordered(self) -> bool:
+        return self.sql_sort and self.sort_order is not None
+
+    def order_by(self) -> List[ColumnElement]:
+        if not self.sql_ordered:
+            return []
+        key, order = self.sort_order
+        column = sql_column(key)
+        # NULL sorts first like sort_key(None), the signature keeps equal values in a stable order
+        if order == Qt.DescendingOrder:
+            return [column.desc(), Question.signature.desc()]
+        return [column, Question.signature]
 
-    def read_data(self):
-        self.questions = db.get_questions_by_foreignkey([self.question_group])
+    @staticmethod
+    def read_rows(signatures: List[str]) -> List[Question]:
+        # runs on the database executor
+        return db.get_questions(signatures, preload=True)
 
-    def reset(self) -> None:
+    def set_questions(self, questions: List[Question]):
         self.beginResetModel()
-        self.read_data()
+        self.questions = questions
+        self.columns = {key: ColumnCache() for key in QuestionGroupDataModel.cached_keys}
+        self._rows = {}
+        self.data_version += 1
+        for row, question in enumerate(self.questions):
+            self._cache_row(row, question)
         self.endResetModel()
 
+    def apply_changes(self, changes: DatabaseChanges):
+        # row level updates (dataChanged/rowsInserted/rowsRemoved), views keep their selection and scroll position
+        if changes.reset or self.loading:
+            # a load which is still running may have read the state before the changes
+            self.reset()
+            return
+        for signature in changes.deleted:
+            row = self._row(signature)
+            if row is not None:
+                self._remove_cached_row(row)
+        group_id = self.question_group.id
+        changed_signatures = {signature for signature, question_group_id
+                              in itertools.chain(changes.inserted.items(), changes.updated.items())
+                              if question_group_id == group_id or self._row(signature) is not None}
+        if not changed_signatures:
+            return
+        self._changed_signatures |= changed_signatures
+        if len(self._changed_signatures) > QuestionGroupDataModel.incremental_update_limit:
+            self.reset()
+            return
+        executor.submit(('question_group_model_rows', id(self)), QuestionGroupDataModel.read_rows,
+                        list(self._changed_signatures), callback=self.update_rows)
+
+    def update_rows(self, questions: List[Question]):
+        self._changed_signatures.clear()
+        for question in questions:
+            row = self._row(question.signature)
+            if question.group_id != self.question_group.id:
+                # moved to another group
+                if row is not None:
+                    self._remove_cached_row(row)
+            elif row is None:
+                row = self._sorted_row(question)
+                self.beginInsertRows(QModelIndex(), row, row)
+                self.questions.insert(row, question)
+                self._cache_row(row, question)
+                self.endInsertRows()
+            else:
+                position = self._sorted_row(question) if self.sql_ordered else row
+                if position in (row, row + 1):
+                    self.questions[row] = question
+                    self._recache_row(row, question)
+                    self.dataChanged.emit(self.index(row, 0), self.index(row, self.columnCount() - 1))
+                    continue
+                # the sort column changed (database order)
+                self.beginMoveRows(QModelIndex(), row, row, QModelIndex(), position)
+                self.questions.pop(row)
+                self._uncache_row(row)
+                if position > row:
+                    position -= 1
+                self.questions.insert(position, question)
+                self._cache_row(position, question)
+                self.endMoveRows()
+
+    def _sorted_row(self, question: Question) -> int:
+        # where the row belongs in the database order (see order_by()), appended without it
+        if not self.sql_ordered:
+            return len(self.questions)
+        key, order = self.sort_order
+        sort_keys = self.columns[key].sort_key
+        signatures = self.columns['signature'].value
+        value = (sort_key(question.all_values()[key].table_value), question.signature)
+        descending = order == Qt.DescendingOrder
+        low, high = 0, len(sort_keys)
+        while low < high:
+            middle = (low + high) // 2
+            entry = (sort_keys[middle], signatures[middle])
+            if (entry > value) if descending else (entry < value):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def sort(self, column: Optional[int], order: Qt.SortOrder = Qt.AscendingOrder) -> None:
+        # only used for large groups (sql_sort, see RuleSortFilterProxyModel.sort), None: the proxy sorts
+        sort_order = None if column is None else (QuestionGroupDataModel.activated_headers[column], order)
+        if sort_order is None:
+            self.sort_order = None
+            executor.cancel(('question_group_model_order', id(self)))
+            return
+        if self.loading:
+            if sort_order != self.sort_order:
+                self.sort_order = sort_order
+                self.reset()
+            return
+        self.sort_order = sort_order
+        self._sort_rows()
+
+    def _sort_rows(self):
+        executor.submit(('question_group_model_order', id(self)), db.get_question_order, self.question_group.id,
+                        self.order_by(), callback=self.set_order)
+
+    def set_order(self, signatures: List[str]):
+        rows = {question.signature: row for row, question in enumerate(self.questions)}
+        order = [rows.pop(signature) for signature in signatures if signature in rows]
+        # rows the query did not see (not committed yet) stay at the end
+        order += sorted(rows.values())
+        if order == list(range(len(self.questions))):
+            return
+        self.layoutAboutToBeChanged.emit()
+        self.questions = [self.questions[row] for row in order]
+        for column in self.columns.values():
+            column.reorder(order)
+        self._rows = {signature: row for row, signature in enumerate(self.columns['signature'].value)}
+        # same rows, the filter results are permuted instead of evaluated again
+        self.rows_reordered.emit(order)
+        new_rows = {row: new_row for new_row, row in enumerate(order)}
+        persistent_indexes = self.persistentIndexList()
+        self.changePersistentIndexList(persistent_indexes, [self.index(new_rows[index.row()], index.column())
+                                                            for index in persistent_indexes])
+        self.layoutChanged.emit()
+
+    def _row(self, signature: str) -> Optional[int]:
+        return self._rows.get(signature)
+
+    def _remove_cached_row(self, row: int):
+        self.beginRemoveRows(QModelIndex(), row, row)
+        self.questions.pop(row)
+        self._uncache_row(row)
+        self.endRemoveRows()
+
+    def question(self, row: int) -> Question:
+        # rows are loaded in the background (detached), attach them before they are edited or deleted
+        self.questions[row] = db.adopt(self.questions[row])
+        return self.questions[row]
+
+    def _cache_row(self, row: int, question: Question):
+        question_values = question.all_values()
+        for key, column in self.columns.items():
+            column.insert(row, question_values[key])
+        self._index_rows(row)
+        self.data_version += 1
+        self.row_cached.emit(row, False)
+
+    def _uncache_row(self, row: int):
+        del self._rows[self.columns['signature'].value[row]]
+        for column in self.columns.values():
+            column.pop(row)
+        self._index_rows(row)
+        self.data_version += 1
+        self.row_uncached.emit(row)
+
+    def _recache_row(self, row: int, question: Question):
+        # in place, the rows below keep their position
+        del self._rows[self.columns['signature'].value[row]]
+        question_values = question.all_values()
+        for key, column in self.columns.items():
+            column.replace(row, question_values[key])
+        self._rows[question.signature] = row
+        self.data_version += 1
+        self.row_cached.emit(row, True)
+
+    def _index_rows(self, start: int):
+        # the rows from start on have a new position (appending only adds the new row)
+        signatures = self.columns['signature'].value
+        self._rows.update(zip(itertools.islice(signatures, start, None), itertools.count(start)))
+
+    def column_values(self) -> Dict[str, List[Any]]:
+        return {key: column.value for key, column in self.columns.items()}
+
+    def column_cache(self, column: int) -> ColumnCache:
+        return self.columns[QuestionGroupDataModel.activated_headers[column]]
+
+    @property
+    def loading(self) -> bool:
+        return executor.pending(('question_group_model', id(self)))
+
+    def reset(self) -> None:
+        self._changed_signatures.clear()
+        executor.cancel(('question_group_model_rows', id(self)))
+        executor.cancel(('question_group_model_order', id(self)))
+        executor.submit(('question_group_model', id(self)), QuestionGroupDataModel.read_data, self.question_group.id,
+                        self.order_by(), callback=self.set_questions)
+
     def rowCount(self, parent: PySide6.QtCore.QModelIndex | PySide6.QtCore.QPersistentModelIndex = ...) -> int:
         return len(self.questions)
 
@@ -121,28 +413,26 @@ class QuestionGroupDataModel(QAbstractTableModel):
             row = index.row()
 
         if role == Qt.UserRole:
-            return self.questions[row]
-
-        if role != Qt.CheckStateRole and role != Qt.DisplayRole and role != Qt.ToolTipRole:
-            return None
+            return self.question(row)
 
-        if role == Qt.CheckStateRole:
-            checkbox = self.questions[row].values(QuestionGroupDataModel.activated_headers[col]).table_checkbox
-            return checkbox
-        elif role == Qt.DisplayRole:
-            value = self.questions[row].values(QuestionGroupDataModel.activated_headers[col]).table_value
-            if type(value) == datetime.date or type(value) == datetime.datetime:
-                value = str(value)
-            return value
+        if role == Qt.DisplayRole:
+            return self.column_cache(col).display[row]
         elif role == Qt.ToolTipRole:
-            tooltip = str(self.questions[row].values(QuestionGroupDataModel.activated_headers[col]).table_tooltip)
-            return tooltip
+            return self.column_cache(col).tooltip[row]
+        elif role == Qt.CheckStateRole:
+            return self.column_cache(col).check_state[row]
+        elif role == SortRole:
+            return self.column_cache(col).sort_key[row]
+        return None
 
     def setData(self, index: PySide6.QtCore.QModelIndex | PySide6.QtCore.QPersistentModelIndex, value: Any,
                 role: int = ...) -> bool:
         if role == Qt.UserRole:
             db.add_object(value)
-            self.questions[index.row()] = value
+            row = index.row()
+            self.questions[row] = value
+            self._recache_row(row, value)
+            self.dataChanged.emit(self.index(row, 0), self.index(row, self.columnCount() - 1))
             return True
         return False
 
@@ -181,8 +471,9 @@ class QuestionGroupDataModel(QAbstractTableModel):
 
     def removeRow(self, row: int,
                   parent: PySide6.QtCore.QModelIndex | PySide6.QtCore.QPersistentModelIndex = ...) -> bool:
-        db.delete(self.questions[row])
+        db.delete(self.question(row))
         self.questions.pop(row)
+        self._uncache_row(row)
         return True
 
     def insertRow(self, row: int,
@@ -194,6 +485,7 @@ class QuestionGroupDataModel(QAbstractTableModel):
         if editor.exec() == QDialog.Accepted:
             db.add_object(editor.question)
             self.questions.insert(row, editor.question)
+            self._cache_row(row, editor.question)
             return True
         else:
             db.abort()
@@ -250,7 +542,7 @@ class QuestionGroupTableView(QTableView):
         force_delete_shortcut = QShortcut(QKeySequence(Qt.SHIFT | Qt.Key_Delete), self, None, None, Qt.WidgetShortcut)
         force_delete_shortcut.activated.connect(lambda: self.delete_selected_items(False))
 
-        vertical_layout = QVBoxLayout(parent)
+        vertical_layout = parent.layout() or QVBoxLayout(parent)
         vertical_layout.addWidget(self)
 
     def delete_selected_items(self, ask_for_confirmation=True):
@@ -321,15 +613,195 @@ class QuestionGroupTableView(QTableView):
 
 
 class RuleSortFilterProxyModel(QSortFilterProxyModel):
-    filters = []  # List[Tuple[Tuple[dict_key, Callable], Tuple[str, FilterOption, Any]]]
+    filters = []  # type: List[QuestionFilter]
+    # incremented by filters_changed(), every proxy re-evaluates its rows once (evaluate())
+    filter_version = 0
+    # a new filter version was applied, argument is the number of matching rows
+    filter_applied = Signal(int)
+
+    def __init__(self, parent=None):
+        super(RuleSortFilterProxyModel, self).__init__(parent)
+        self.setSortRole(SortRole)
+        # the filters the proxy shows right now, newer ones are evaluated on the database executor
+        self.applied_filters = list(RuleSortFilterProxyModel.filters)
+        self.applied_version = RuleSortFilterProxyModel.filter_version
+        self._matches = None  # type: Optional[bytearray]
+        self._matches_version = None
+        self._evaluation = None  # type: Optional[Tuple[int, int, List[QuestionFilter]]]
+
+    @staticmethod
+    def filters_changed():
+        RuleSortFilterProxyModel.filter_version += 1
+
+    @property
+    def evaluated(self) -> bool:
+        return self.applied_version == RuleSortFilterProxyModel.filter_version
+
+    def matches(self) -> Optional[bytearray]:
+        # 0/1 per source row, evaluated for all rows at once and cached. Single row changes are applied to it
+        # (row_cached/row_uncached), everything else evaluates it again
+        model = self.sourceModel()  # type: QuestionGroupDataModel
+        if self._matches_version != model.data_version:
+            self._matches = evaluate_filters(self.applied_filters, model.column_values(), model.rowCount())
+            self._matches_version = model.data_version
+        return self._matches
+
+    def evaluate(self):
+        # applies the current filters: evaluated on the database executor on a copy of the cached columns, until
+        # then the previous result stays. A newer evaluation of the same proxy supersedes the pending one.
+        model = self.sourceModel()  # type: QuestionGroupDataModel
+        if self.evaluated:
+            return
+        filters = list(RuleSortFilterProxyModel.filters)
+        self._evaluation = (RuleSortFilterProxyModel.filter_version, model.data_version, filters)
+        if not filters or model.loading:
+            # nothing to evaluate (yet), the rows are filtered when they arrive
+            executor.cancel(('filter_matches', id(self)))
+            self._apply_matches(None)
+            return
+        keys = {question_filter.column for question_filter in filters} | {'signature'}
+        columns = {key: list(values) for key, values in model.column_values().items() if key in keys}
+        executor.submit(('filter_matches', id(self)), evaluate_filters, filters, columns, model.rowCount(),
+                        callback=self._apply_matches)
+
+    def _apply_matches(self, matches: Optional[bytearray]):
+        filter_version, data_version, filters = self._evaluation
+        if filter_version != RuleSortFilterProxyModel.filter_version:
+            return
+        model = self.sourceModel()  # type: QuestionGroupDataModel
+        self.applied_filters = filters
+        self.applied_version = filter_version
+        if matches is not None and data_version == model.data_version:
+            self._matches = matches
+            self._matches_version = data_version
+        else:
+            # no filters or the rows changed in the meantime: the matches of the previous filters must neither be
+            # returned nor updated row by row, matches() evaluates them again
+            self._matches = None
+            self._matches_version = None
+        self.invalidateFilter()
+        self.filter_applied.emit(self.rowCount())
+
+    def setSourceModel(self, source_model: QuestionGroupDataModel) -> None:
+        super(RuleSortFilterProxyModel, self).setSourceModel(source_model)
+        source_model.rows_reordered.connect(self._reorder_matches)
+        source_model.row_cached.connect(self._row_cached)
+        source_model.row_uncached.connect(self._row_uncached)
+
+    def _incremental(self) -> bool:
+        # the cached matches are valid up to the single row change which was just made
+        return self._matches is not None and self._matches_version == self.sourceModel().data_version - 1
+
+    def _row_cached(self, row: int, replaced: bool):
+        if not self._incremental():
+            return
+        model = self.sourceModel()  # type: QuestionGroupDataModel
+        columns = {key: values[row:row + 1] for key, values in model.column_values().items()}
+        match = evaluate_filters(self.applied_filters, columns, 1)[0]
+        if replaced:
+            self._matches[row] = match
+        else:
+            self._matches.insert(row, match)
+        self._matches_version = model.data_version
+
+    def _row_uncached(self, row: int):
+        if not self._incremental():
+            return
+        del self._matches[row]
+        self._matches_version = self.sourceModel().data_version
+
+    def _reorder_matches(self, order: List[int]):
+        if self._matches is not None and self._matches_version == self.sourceModel().data_version:
+            self._matches = bytearray(self._matches[row] for row in order)
+        if self._evaluation is not None:
+            # a pending evaluation works on the previous order, its result is evaluated again when it arrives
+            filter_version, _, filters = self._evaluation
+            self._evaluation = (filter_version, None, filters)
+
+    def sort(self, column: int, order: Qt.SortOrder = Qt.AscendingOrder) -> None:
+        model = self.sourceModel()  # type: QuestionGroupDataModel
+        if column >= 0 and model is not None and model.sql_sort:
+            if QuestionGroupDataModel.activated_headers[column] in QuestionGroupDataModel.sql_sort_columns:
+                # the database orders the rows of large groups, the proxy keeps the source order (a descending
+                # unsorted proxy would reverse it)
+                super(RuleSortFilterProxyModel, self).sort(-1, Qt.AscendingOrder)
+                model.sort(column, order)
+                return
+            model.sort(None)
+        super(RuleSortFilterProxyModel, self).sort(column, order)
 
     def filterAcceptsRow(self, source_row: int, source_parent: PySide6.QtCore.QModelIndex |
                                                                PySide6.QtCore.QPersistentModelIndex) -> bool:
-        if not RuleSortFilterProxyModel.filters:
+        if not self.applied_filters:
             return True
+        return bool(self.matches()[source_row])
+
+    def lessThan(self, source_left: PySide6.QtCore.QModelIndex | PySide6.QtCore.QPersistentModelIndex,
+                 source_right: PySide6.QtCore.QModelIndex | PySide6.QtCore.QPersistentModelIndex) -> bool:
+        sort_keys = self.sourceModel().column_cache(source_left.column()).sort_key
+        return sort_keys[source_left.row()] < sort_keys[source_right.row()]
+
 
-        cur_question = self.sourceModel().data(source_row, Qt.UserRole)
-        answer = True
-        for ((target, filter_function), _) in RuleSortFilterProxyModel.filters:
-            answer = answer & filter_function(cur_question.values(target).table_value)
-        return answer
+class QuestionGroupTab(QWidget):
+    # placeholder until it is shown for the first time, only then the view, the models and the query are created.
+    # release() drops them again (tabs which were not visited for a while), the next visit reloads the questions
+    materialized = Signal()
+
+    def __init__(self, question_group, question_count: int = 0, parent=None):
+        super(QuestionGroupTab, self).__init__(parent)
+        self.question_group = question_group
+        # aggregate counts (see DatabaseConnector.get_question_counts) while there is no model,
+        # filtered_count is None without filters
+        self.question_count = question_count
+        self.filtered_count = None  # type: Optional[int]
+        self.view = None  # type: Optional[QuestionGroupTableView]
+        self.model = None  # type: Optional[QuestionGroupDataModel]
+        self.filter_model = None  # type: Optional[RuleSortFilterProxyModel]
+        self.last_shown = time.monotonic()
+        QVBoxLayout(self)
+
+    @property
+    def row_count(self) -> int:
+        if self.model is None:
+            return self.question_count
+        return self.model.rowCount()
+
+    @property
+    def hit_count(self) -> Optional[int]:
+        # questions matching the applied filters, None without filters or while it is not known yet
+        if self.model is None:
+            return self.filtered_count
+        if not self.filter_model.applied_filters or self.model.loading:
+            return None
+        return self.filter_model.rowCount()
+
+    def materialize(self):
+        if self.model is not None:
+            return
+        self.view = QuestionGroupTableView(self)
+        self.model = QuestionGroupDataModel(self.question_group, self.view,
+                                            sql_sort=self.question_count >= sql_sort_threshold)
+        self.filter_model = RuleSortFilterProxyModel(self.view)
+        self.filter_model.setSourceModel(self.model)
+        self.view.setModel(self.filter_model)
+        self.view.sortByColumn(0, Qt.AscendingOrder)
+        self.materialized.emit()
+
+    def release(self):
+        if self.model is None or self.isVisible():
+            return
+        self.question_count = self.model.rowCount()
+        self.filtered_count = self.hit_count
+        self.layout().removeWidget(self.view)
+        # model and filter model are children of the view
+        self.view.deleteLater()
+        self.view = self.model = self.filter_model = None
+
+    def showEvent(self, event: QShowEvent) -> None:
+        self.materialize()
+        self.last_shown = time.monotonic()
+        super(QuestionGroupTab, self).showEvent(event)
+
+    def hideEvent(self, event: QHideEvent) -> None:
+        self.last_shown = time.monotonic()
+        super(QuestionGroupTab, self).hideEvent(event)
@@ -1,6 +1,7 @@
 from PySide6.QtWidgets import QDialog, QTableWidgetItem, QHBoxLayout, QTableWidget, QAbstractItemView
 
 from src.database import db
+from src.database_executor import executor
 from src.datatypes import RegeltestQuestion
 from src.ui_regeltest_archive import Ui_RegeltestArchiveDialog
 
@@ -16,7 +17,11 @@ class PreviousRegeltests(QDialog, Ui_RegeltestArchiveDialog):
 
         self.ui.regeltestTable.itemDoubleClicked.connect(self.preview)
 
-        self.regeltests = db.get_regeltests()
+        self.regeltests = []
+        executor.submit('previous_regeltests', db.get_regeltests, preload=True, callback=self.set_regeltests)
+
+    def set_regeltests(self, regeltests):
+        self.regeltests = regeltests
         for index, regeltest in enumerate(self.regeltests):
             self.ui.regeltestTable.insertRow(index)
             self.ui.regeltestTable.setItem(index, 0, QTableWidgetItem(str(regeltest.id)))
@@ -76,4 +81,4 @@ class PreviousRegeltests(QDialog, Ui_RegeltestArchiveDialog):
             return []
         else:
             regeltest = self.regeltests[items[0].row()]
-        return [question.question for question in regeltest.selected_questions]
+        return [db.adopt(question.question) for question in regeltest.selected_questions]
@@ -269,19 +269,11 @@ class RegeltestSetup(QDialog, Ui_RegeltestSetup):
 
     def collect_questions(self):
         questions = []
-        for question_group_widget in self.question_group_widgets:
-            question_group, text, mchoice = question_group_widget.get_parameters()
-            text_questions = []
-            mchoice_questions = []
-            if text:
-                text_questions = db.get_questions_by_foreignkey([question_group], mchoice=False,
-                                                                randomize=True)[
-                                 0:text]
-            if mchoice:
-                mchoice_questions = db.get_questions_by_foreignkey([question_group], mchoice=True,
-                                                                   randomize=True)[
-                                    0:mchoice]
-            text_questions += mchoice_questions
+        parameters = [question_group_widget.get_parameters() for question_group_widget in self.question_group_widgets]
+        samples = db.sample_questions(parameters)
+        for question_group, _, _ in parameters:
+            text_questions = samples.get((question_group.id, False), []) + \
+                             samples.get((question_group.id, True), [])
             if self.ui.checkbox_textmchoice.isChecked():
                 random.shuffle(text_questions)
             questions += text_questions